@@ -1,183 +1,394 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_caching import Cache
-from scipy.stats import percentileofscore
+import argparse
 import csv
 import sys
 import re
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 import pandas as pd
 import numpy as np
+from search_index import SearchIndex
+from location_index import LocationIndex
+from range_index import RangeIndex
+from row_cache import RowCache, dumps
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestMetrics
+from schema import to_python
+from changes import TRACKED, ChangeIndex
+import snapshot
 
 # Initialise Flask app and cache
 app = Flask(__name__)
 cache = Cache(app, config={'CACHE_TYPE': "simple"})
 
-# Global variable to hold the DataFrame
-df = None
+# Cache of loaded snapshots, created in __main__
+snapshots = None
 
-def parse_arguments():
-    try:
-        date = sys.argv[1]
-    except:
-        print("Please provide date for file you want to search. Expect DD-MM-YYYY. ")
-        sys.exit(1)
+# Price, score and review-count changes between snapshots, created in __main__
+change_index = None
+
+# Endpoints answered without loading a snapshot
+SNAPSHOT_FREE_ENDPOINTS = {'get_metrics', 'get_movers', 'get_new_listings', 'get_delisted', 'get_price_history'}
+
+# Per-route latency and rows scanned, served at /metrics
+request_metrics = RequestMetrics()
+
+# Optional tie-breakers for listings with the same cost (higher is better)
+SECONDARY_SORT_KEYS = ['review_score', 'number_of_reviews']
+
+# Responses are streamed as newline-delimited JSON when a client asks for this type
+NDJSON = 'application/x-ndjson'
+NDJSON_BATCH_ROWS = 1000
+
+# Snapshots loaded into memory at once are bounded by this budget unless --cache-mb is given
+DEFAULT_CACHE_MB = 2048
+
+# A loaded snapshot's files are re-checked for changes at most this often (seconds)
+RELOAD_INTERVAL = 60
 
+SNAPSHOT_PATTERN = re.compile(r'^(\d{2}-\d{2}-\d{4})\.(csv|columns)$')
+
+def validate_date(date):
     if not re.match(r'^\d{2}-\d{2}-\d{4}$', date):
-        print("Date is not in the correct format. Expected DD-MM-YYYY.")
-        sys.exit(1)
+        return "Date is not in the correct format. Expected DD-MM-YYYY."
     try:
         datetime.strptime(date, '%d-%m-%Y')
     except ValueError:
-        print("Invalid date provided.")
-        sys.exit(1)
+        return "Invalid date provided."
+    return None
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Serve scraped Booking.com listings.")
+    parser.add_argument('date', nargs='?', help="Default scrape date to serve (DD-MM-YYYY). Defaults to the newest file in output/.")
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB, help="Memory budget for snapshots held at once.")
+    args = parser.parse_args()
+
+    if args.date is not None:
+        error = validate_date(args.date)
+        if error:
+            print(error)
+            sys.exit(1)
 
-    return date
+    return args
 
 def load_csv_to_dataframe(date):
+    # Prefer the memory-mapped columnar snapshot; the CSV is only parsed when it is missing or stale
+    return snapshot.load_frame(f"output/{date}.csv")
+
+def build_indexes(df):
+    # Cost-ordered permutations are computed once so /cheapest pages become O(per_page) slices
+    cost = df['cost'].to_numpy(dtype=float)
+    cost_order = {None: np.argsort(cost, kind='stable')}
+    for key in SECONDARY_SORT_KEYS:
+        if key in df.columns:
+            secondary = df[key].to_numpy(dtype=float)
+            # lexsort uses the last key as the primary one; negate so better listings come first within a cost
+            cost_order[key] = np.lexsort((-secondary, cost))
+    return {'cost_order': cost_order, 'range': RangeIndex(df, cost_order[None]), 'search': SearchIndex(df),
+            'location': LocationIndex(df), 'rows': RowCache(df)}
+
+def snapshot_mtime(date):
     csv_file = f"output/{date}.csv"
-    if not os.path.exists(csv_file):
-        print(f"Error: File '{csv_file}' does not exist in the /output directory.")
-        exit(1)
-    
+    files = [csv_file, os.path.join(snapshot.columns_path(csv_file), "meta.json")]
+    return max((os.path.getmtime(f) for f in files if os.path.exists(f)), default=None)
+
+class Snapshot:
+    def __init__(self, date):
+        self.date = date
+        self.mtime = snapshot_mtime(date)
+        self.checked = time.monotonic()
+        self.df = load_csv_to_dataframe(date)
+        self.indexes = build_indexes(self.df)
+        self.nbytes = int(self.df.memory_usage(deep=True).sum()) + sum(
+            order.nbytes for order in self.indexes['cost_order'].values()) + self.indexes['search'].nbytes + \
+            self.indexes['location'].nbytes + self.indexes['range'].nbytes + self.indexes['rows'].nbytes
+
+    def is_stale(self):
+        if time.monotonic() - self.checked < RELOAD_INTERVAL:
+            return False
+        self.checked = time.monotonic()
+        return snapshot_mtime(self.date) != self.mtime
+
+class SnapshotCache:
+    # Least-recently-used snapshots are evicted once the loaded total exceeds the memory budget
+    def __init__(self, budget_bytes, default_date=None):
+        self.budget_bytes = budget_bytes
+        self.default_date = default_date
+        self.loaded = OrderedDict()
+        # Guards self.loaded; each date being loaded has its own lock in self.loading
+        self.lock = threading.Lock()
+        self.loading = {}
+
+    def available_dates(self):
+        # Rescanned on every call so new scrapes are served without a restart
+        if not os.path.isdir("output"):
+            return []
+        dates = {match.group(1) for match in map(SNAPSHOT_PATTERN.match, os.listdir("output")) if match}
+        return sorted((d for d in dates if validate_date(d) is None), key=lambda d: datetime.strptime(d, '%d-%m-%Y'))
+
+    def newest(self):
+        dates = self.available_dates()
+        return dates[-1] if dates else None
+
+    def get(self, date=None):
+        date = date or self.default_date or self.newest()
+        if date is None:
+            raise FileNotFoundError("No snapshots found in the /output directory.")
+
+        with self.lock:
+            cached = self.loaded.get(date)
+            if cached is not None and not cached.is_stale():
+                self.loaded.move_to_end(date)
+                return cached
+            loading = self.loading.setdefault(date, threading.Lock())
+
+        # Snapshots load outside the cache lock, so other dates (and a stale copy of this one) are served
+        # meanwhile; concurrent requests for the same date wait for a single load
+        with loading:
+            try:
+                with self.lock:
+                    current = self.loaded.get(date)
+                    if current is not None and current is not cached:
+                        self.loaded.move_to_end(date)
+                        return current
+
+                if snapshot_mtime(date) is None:
+                    with self.lock:
+                        self.loaded.pop(date, None)
+                    raise FileNotFoundError(f"No snapshot for {date} in the /output directory.")
+                loaded = Snapshot(date)
+                with self.lock:
+                    self.loaded[date] = loaded
+                    self.loaded.move_to_end(date)
+                    self.evict()
+                return loaded
+            finally:
+                with self.lock:
+                    self.loading.pop(date, None)
+
+    def evict(self):
+        # The most recently used snapshot always stays, even if it alone exceeds the budget
+        while len(self.loaded) > 1 and sum(s.nbytes for s in self.loaded.values()) > self.budget_bytes:
+            date, evicted = self.loaded.popitem(last=False)
+            print(f"Evicted snapshot {date} ({evicted.nbytes / 2**20:.0f} MiB) from cache")
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.before_request
+def resolve_snapshot():
+    # Every endpoint accepts ?date=DD-MM-YYYY and otherwise serves the default (newest) snapshot; unrouted
+    # requests (404s such as /favicon.ico) load nothing
+    if request.endpoint is None or request.endpoint in SNAPSHOT_FREE_ENDPOINTS:
+        return
+    date = request.args.get('date', None, type=str)
+    if date is not None:
+        error = validate_date(date)
+        if error:
+            return jsonify({"error": error}), 400
     try:
-        df = pd.read_csv(csv_file)
-        # Convert 'cost' column to numeric after removing commas (if it exists)
-        if 'cost' in df.columns:
-            df['cost'] = df['cost'].astype(str).str.replace(',', '')
-            df['cost'] = pd.to_numeric(df['cost'], errors='coerce')
-        return df
-    except Exception as e:
-        print(f"Error loading CSV file: {e}")
-        exit(1)
+        g.snapshot = snapshots.get(date)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+
+@app.after_request
+def add_snapshot_header(response):
+    if 'snapshot' in g:
+        response.headers['X-Snapshot-Date'] = g.snapshot.date
+    return response
+
+@app.after_request
+def record_metrics(response):
+    # Streamed responses are timed until their first byte is ready, not until the last is sent
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_metrics.observe(route, response.status_code, time.perf_counter() - g.started, g.get('rows_scanned', 0))
+    return response
+
+def count_rows(n):
+    # Listings read to answer the current request, reported in /metrics
+    g.rows_scanned = g.get('rows_scanned', 0) + int(n)
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+def ndjson_response(row_cache, rows):
+    # Streams every row, one JSON object per line, a batch at a time
+    def generate():
+        for start in range(0, len(rows), NDJSON_BATCH_ROWS):
+            yield b'\n'.join(row_cache.rows(rows[start:start + NDJSON_BATCH_ROWS])) + b'\n'
+    response = Response(generate(), mimetype=NDJSON)
+    response.headers['X-Total-Items'] = str(len(rows))
+    return response
+
+def paginated_response(indexes, rows, page, per_page):
+    # `rows` is an ordered array of row positions; only the requested page is sent, from pre-serialised rows
+    if page < 1 or per_page < 1:
+        return jsonify({"error": "page and per_page must be at least 1."}), 400
+    if wants_ndjson():
+        count_rows(len(rows))
+        return ndjson_response(indexes['rows'], rows)
+    total_items = len(rows)
+    start = (page - 1) * per_page
+    end = start + per_page
+    count_rows(len(rows[start:end]))
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total_items': total_items,
+        'total_pages': (total_items + per_page - 1) // per_page
+    }
+    body = b'{"items":' + indexes['rows'].array(rows[start:end]) + b',"pagination":' + dumps(pagination) + b'}'
+    return Response(body, mimetype='application/json'), 200
 
 @app.route("/cheapest", methods=["GET"])
 def get_cheapest():
+    indexes = g.snapshot.indexes
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
+    then_by = request.args.get('then_by', None, type=str)
+
+    if then_by not in indexes['cost_order']:
+        return jsonify({"error": f"Cannot break ties by '{then_by}'. Expected one of {SECONDARY_SORT_KEYS}."}), 400
 
     try:
-        sorted_df = df.sort_values(by="cost")
-        total_items = len(sorted_df)
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_df = sorted_df.iloc[start:end]
-
-        response = {
-            'items': paginated_df.to_dict(orient='records'),
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_items': total_items,
-                'total_pages': (total_items + per_page - 1) // per_page
-            }
-        }
-        return jsonify(response), 200
+        return paginated_response(indexes, indexes['cost_order'][then_by], page, per_page)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/stats", methods=["GET"])
 def get_stats():
+    df = g.snapshot.df
+    count_rows(len(df))
     stats = {
-        'average_price': np.round(df['cost'].mean(), 2),
-        'median_price': np.round(df['cost'].median(), 2),
+        'average_price': round(float(df['cost'].mean()), 2),
+        'median_price': round(float(df['cost'].median()), 2),
         'total_listings': len(df),
         'price_range': {
             'min': int(df['cost'].min()),
             'max': int(df['cost'].max())
         },
-        'average_review_score': np.round(df['review_score'].apply(pd.to_numeric, errors='coerce').mean(), 2) if 'review_score' in df.columns else None,
+        'average_review_score': round(float(df['review_score'].mean()), 2) if 'review_score' in df.columns else None,
         'most_common_room_type': df['room_type'].mode()[0] if 'room_type' in df.columns else None
     }
     return jsonify(stats), 200
 
 @app.route("/search", methods=["GET"])
 def search_listings():
-    keyword = request.args.get('q', '').lower()
-    results = df[df.apply(lambda row: keyword in str(row['title']).lower() or keyword in str(row['address']).lower(), axis=1)].to_dict('records')
-    return jsonify(results), 200
+    indexes = g.snapshot.indexes
+    keyword = request.args.get('q', '')
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+
+    rows, _ = indexes['search'].search(keyword)
+    # Every match is read to rank it
+    count_rows(len(rows))
+    return paginated_response(indexes, rows, page, per_page)
+
+def price_bounds():
+    # ?min= and ?max= as floats (None when absent); NaN and infinity would silently match nothing
+    min_price = request.args.get('min', None, type=float)
+    max_price = request.args.get('max', None, type=float)
+    if any(bound is not None and not np.isfinite(bound) for bound in (min_price, max_price)):
+        return None, None, (jsonify({"error": "min and max must be finite numbers."}), 400)
+    return min_price, max_price, None
 
 @app.route("/price_range", methods=["GET"])
 def get_price_range():
-    min_price = request.args.get('min', type=float)
-    max_price = request.args.get('max', type=float)
-    filtered_data = df[(df['cost'] >= min_price) & (df['cost'] <= max_price)].to_dict('records')
-    return jsonify(filtered_data), 200
+    indexes = g.snapshot.indexes
+    min_price, max_price, error = price_bounds()
+    if error:
+        return error
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+
+    # Listings within the range, cheapest first
+    rows = indexes['range'].rows_between(min_price, max_price)
+    return paginated_response(indexes, rows, page, per_page)
 
 @app.route("/best_value", methods=["GET"])
 def get_best_value():
-    min_price = request.args.get('min', type=float)
-    max_price = request.args.get('max', type=float)
-    filtered_df = df[(df['cost'] >= min_price) & (df['cost'] <= max_price)]
-    
-    if 'review_score' in filtered_df.columns:
-        filtered_df['review_score'] = pd.to_numeric(filtered_df['review_score'], errors='coerce')
-    
-    filtered_df = filtered_df.dropna(subset=['review_score', 'cost'])
-    filtered_df['value_score'] = filtered_df['review_score'] / filtered_df['cost']
-    
-    best_value = filtered_df.sort_values('value_score', ascending=False).head(10).to_dict('records')
-    return jsonify(best_value), 200
+    indexes = g.snapshot.indexes
+    min_price, max_price, error = price_bounds()
+    if error:
+        return error
+    k = request.args.get('k', 10, type=int)
+
+    if k < 1:
+        return jsonify({"error": "k must be at least 1."}), 400
+
+    # New listings have no review score, so they have no value score either
+    rows, scores = indexes['range'].best_value(min_price, max_price, k)
+    count_rows(len(indexes['range'].rows_between(min_price, max_price)))
+    # Each pre-serialised row gets its value score appended as the last key
+    best_value = [row[:-1] + b',"value_score":' + dumps(score) + b'}'
+                  for row, score in zip(indexes['rows'].rows(rows), to_python(pd.Series(scores)))]
+    return Response(b'[' + b','.join(best_value) + b']', mimetype='application/json'), 200
 
 @app.route("/location_analysis", methods=["GET"])
 def market_analysis():
+    df, indexes = g.snapshot.df, g.snapshot.indexes
     location = request.args.get('location', '', type=str).lower()
     
     if not location:
         return jsonify({"error": "Please provide a location parameter, e.g. ?location=Sydney"}), 400
 
-    filtered_df = df[df['address'].str.lower().str.contains(location, na=False)]
+    # Every address containing the location counts; stats precomputed for a locality or region key are used when
+    # its addresses are all of those
+    summary = indexes['location'].lookup(location)
     
-    if filtered_df.empty:
+    if summary is None:
         return jsonify({"error": f"No listings found for location '{location}'."}), 404
-    
-    filtered_df['cost'] = pd.to_numeric(filtered_df['cost'], errors='coerce').fillna(0)
-    filtered_df['review_score'] = pd.to_numeric(filtered_df['review_score'], errors='coerce').fillna(0)
+    count_rows(summary.rows_scanned)
 
     stats = {
         "location": location.title(),
-        "total_listings": int(len(filtered_df)),
-        "average_price": round(filtered_df['cost'].mean(), 2),
-        "median_price": round(filtered_df['cost'].median(), 2),
-        "price_variance": round(filtered_df['cost'].var(), 2),
-        "min_price": int(filtered_df['cost'].min()),
-        "max_price": int(filtered_df['cost'].max()),
-        "average_review_score": round(filtered_df['review_score'].mean(), 2) if 'review_score' in filtered_df.columns else None
+        "total_listings": summary.count,
+        "average_price": round(float(summary.average_price), 2),
+        "median_price": round(float(summary.median_price), 2),
+        "price_variance": round(float(summary.price_variance), 2),
+        "min_price": int(summary.min_price),
+        "max_price": int(summary.max_price),
+        "average_review_score": round(float(summary.average_review_score), 2) if 'review_score' in df.columns else None
     }
     
     return jsonify(stats), 200
 
 @app.route("/property_percentile", methods=["GET"])
 def property_percentile():
+    df, indexes = g.snapshot.df, g.snapshot.indexes
     property_name = request.args.get('name', '', type=str).lower()
     if not property_name:
         return jsonify({"error": "Please provide a property name using the 'name' query parameter."}), 400
 
-    matching_properties = df[df['title'].str.lower().str.contains(property_name, na=False)]
-    if matching_properties.empty:
+    matching_rows = indexes['search'].rows_containing('title', property_name)
+    if len(matching_rows) == 0:
         return jsonify({"error": f"No property found matching '{property_name}'."}), 404
 
-    property_row = matching_properties.iloc[0]
+    property_row = df.iloc[matching_rows[0]]
+    count_rows(1)
     
-    # Assume location is the first part of the address (before a comma)
+    # The property's whole address is its location key
     address = property_row['address']
-    location = address.strip().lower() if address else ''
+    location = address.strip().lower() if isinstance(address, str) else ''
     
-    location_listings = df[df['address'].str.lower().str.contains(location, na=False)]
-    if location_listings.empty:
+    summary = indexes['location'].lookup(location)
+    if summary is None:
         return jsonify({"error": f"No listings found for location '{location}'."}), 404
 
-    location_listings['cost'] = pd.to_numeric(location_listings['cost'], errors='coerce')
     property_cost = pd.to_numeric(property_row['cost'], errors='coerce')
     if pd.isna(property_cost):
         return jsonify({"error": "The property's cost is not a valid number."}), 500
 
-    costs = location_listings['cost'].tolist()
-    percentile = percentileofscore(costs, property_cost)
+    count_rows(summary.rows_scanned)
+    percentile = summary.percentile(property_cost)
 
     result = {
         "property_name": property_row['title'],
-        "property_cost": property_cost,
+        "property_cost": float(property_cost),
         "location": location.title(),
         "relative_price_percentile": percentile,
         "interpretation": (
@@ -187,10 +398,99 @@ def property_percentile():
     }
     return jsonify(result), 200
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    loaded = list(snapshots.loaded.values()) if snapshots else []
+    gauges = [
+        ("api_snapshots_loaded", "Snapshots held in the cache.", len(loaded)),
+        ("api_snapshot_cache_bytes", "Memory held by cached snapshots and their indexes.", sum(s.nbytes for s in loaded)),
+    ]
+    return Response(request_metrics.render(gauges), content_type=METRICS_CONTENT_TYPE)
+
+def change_day():
+    # The indexed snapshot that ?date= names (the newest by default)
+    date = request.args.get('date', None, type=str)
+    if date is not None:
+        error = validate_date(date)
+        if error:
+            return None, (jsonify({"error": error}), 400)
+    day = change_index.resolve(date)
+    if day is None:
+        return None, (jsonify({"error": f"No indexed snapshot for {date or 'any date'} in the /output directory."}), 404)
+    return day, None
+
+@app.route("/movers", methods=["GET"])
+def get_movers():
+    field = request.args.get('by', 'cost', type=str)
+    direction = request.args.get('direction', 'any', type=str)
+    limit = request.args.get('limit', 20, type=int)
+
+    if field not in TRACKED:
+        return jsonify({"error": f"Cannot rank movers by '{field}'. Expected one of {list(TRACKED)}."}), 400
+    if direction not in ('up', 'down', 'any'):
+        return jsonify({"error": "direction must be one of 'up', 'down' or 'any'."}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1."}), 400
+
+    day, error = change_day()
+    if error:
+        return error
+    movers = change_index.movers(day, field, direction, limit)
+    count_rows(len(movers))
+    return jsonify(movers), 200
+
+def listed_response(kind):
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    day, error = change_day()
+    if error:
+        return error
+    items, total_items = change_index.listed(day, kind, page, per_page)
+    count_rows(len(items))
+    pagination = {
+        'page': page,
+        'per_page': per_page,
+        'total_items': total_items,
+        'total_pages': (total_items + per_page - 1) // per_page
+    }
+    return jsonify({'items': items, 'pagination': pagination}), 200
+
+@app.route("/new_listings", methods=["GET"])
+def get_new_listings():
+    # Listings in the snapshot that were not in the one before it
+    return listed_response('new')
+
+@app.route("/delisted", methods=["GET"])
+def get_delisted():
+    # Listings in the previous snapshot that are missing from this one
+    return listed_response('delisted')
+
+@app.route("/price_history", methods=["GET"])
+def get_price_history():
+    url = request.args.get('url', '', type=str)
+    if not url:
+        return jsonify({"error": "Please provide a listing URL using the 'url' query parameter."}), 400
+
+    history = change_index.history(url)
+    if history is None:
+        return jsonify({"error": f"No listing found with URL '{url}'."}), 404
+    count_rows(len(history['history']))
+    return jsonify(history), 200
+
 if __name__ == "__main__":
-    # Parse command-line arguments and load the CSV file into a global DataFrame
-    date_arg = parse_arguments()
-    df = load_csv_to_dataframe(date_arg)
+    # Parse command-line arguments and warm the cache with the default snapshot
+    args = parse_arguments()
+    snapshots = SnapshotCache(args.cache_mb * 2**20, default_date=args.date)
+    # New scrapes are indexed at startup and then in the background; requests only read the index
+    refresher = ChangeIndex()
+    refresher.update()
+    refresher.refresh()
+    change_index = ChangeIndex()
+    try:
+        print(f"Serving {snapshots.get().date} by default")
+    except Exception as e:
+        print(f"Error loading snapshot: {e}")
+        sys.exit(1)
 
     # Start the Flask app
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
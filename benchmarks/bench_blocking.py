@@ -0,0 +1,74 @@
+# Scrapes the same fixture buckets with every resource allowed and with the default block policy, and
+# compares what the fixture server sent, the scraper's own network tally and the time each bucket took
+# Usage: python benchmarks/bench_blocking.py [buckets]   (needs Chrome and chromedriver)
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from browser import fixture_scraper, headless_driver
+from fixtures.server import start_server
+from network import BlockPolicy
+from waits import Waiter, WaitPolicy
+
+# $10 buckets under the result cap, so each is one open and one scroll pass
+FIRST_BUCKET = 500
+
+
+class Records:
+    # Stands in for RunReport, keeping the bucket records in memory
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def served(base_url, reset=False):
+    with urllib.request.urlopen(f"{base_url}/__stats?reset={int(reset)}") as response:
+        return json.load(response)
+
+
+def run(base_url, policy, buckets):
+    driver = headless_driver()
+    try:
+        scraper = fixture_scraper(driver, policy)
+        scraper.waiter = Waiter(driver, WaitPolicy(jitter=(0, 0), settle=0.5, poll=0.05))
+        scraper.archive_pages = False
+        scraper.report = Records()
+        served(base_url, reset=True)
+        start = time.perf_counter()
+        for lower in range(FIRST_BUCKET, FIRST_BUCKET + 10 * buckets, 10):
+            scraper.bucket_label = f"{lower} to {lower + 9}"
+            url = f"{base_url}/searchresults.html?ss=Australia&nflt=price%3DAUD-{lower}-{lower + 9}-1"
+            with contextlib.redirect_stdout(io.StringIO()):
+                scraper.scrape_bucket(scraper.open_bucket(url))
+        return time.perf_counter() - start, served(base_url), scraper.report.records
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    buckets = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server, base_url = start_server()
+    try:
+        results = {}
+        for name, policy in [("allow all", None), ("block", BlockPolicy())]:
+            seconds, stats, records = run(base_url, policy, buckets)
+            network = {key: sum(record['network'][key] for record in records) for key in records[0]['network']}
+            results[name] = seconds, stats, network
+            print(f"{name:<10} {seconds:6.2f} s for {buckets} buckets; server sent {sum(stats['bytes'].values()) / 2**20:6.2f} MiB "
+                  f"{stats['requests']}; browser received {network['bytes'] / 2**20:.2f} MiB in {network['requests']} requests, "
+                  f"blocked {network['blocked']}, page loads {network['page_load_seconds']:.2f} s")
+
+        (allowed, allowed_stats, allowed_network), (blocked, blocked_stats, blocked_network) = results.values()
+        saved = sum(allowed_stats['bytes'].values()) - sum(blocked_stats['bytes'].values())
+        print(f"\nBlocking saved {saved / 2**20:.2f} MiB ({saved / buckets / 2**10:.0f} KiB per bucket), "
+              f"{allowed - blocked:.2f} s of scraping and "
+              f"{allowed_network['page_load_seconds'] - blocked_network['page_load_seconds']:.2f} s of page loads")
+    finally:
+        server.shutdown()
@@ -0,0 +1,67 @@
+# Times each "Load more results" batch on a long fixture page with the old discovery (fetch every card,
+# slice off the ones already read) and with tagged and dropped cards, which only fetch the new batch
+# Usage: python benchmarks/bench_discovery.py [cards]   (needs Chrome and chromedriver)
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium.webdriver.common.by import By
+from browser import fixture_scraper, headless_driver
+from fixtures.server import BATCH_CARDS, start_server
+from main import FINISH_CARDS_SCRIPT
+from waits import CARD_SELECTOR, NEW_CARD_SELECTOR, Waiter, WaitPolicy
+
+# $171-$180 is over the result cap, so the page grows to the full 1,000 cards
+PAGE = "/searchresults.html?ss=Australia&nflt=price%3DAUD-171-180-1&initial={initial}"
+
+
+def rescan(scraper, count):
+    items = scraper.driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR)
+    scraper.extract_cards(items[count:])
+    return len(items)
+
+
+def incremental(drop):
+    def discover(scraper, count):
+        items = scraper.driver.find_elements(By.CSS_SELECTOR, NEW_CARD_SELECTOR)
+        scraper.extract_cards(items)
+        scraper.driver.execute_script(FINISH_CARDS_SCRIPT, items, drop)
+        return count + len(items)
+    return discover
+
+
+def run(driver, base_url, cards, discover):
+    # Returns the milliseconds each batch took to discover and read its cards (page loading is not timed)
+    scraper = fixture_scraper(driver)
+    waiter = Waiter(driver, WaitPolicy(jitter=(0, 0), poll=0.02))
+    driver.get(base_url + PAGE.format(initial=BATCH_CARDS))
+    waiter.for_cards_beyond(0)
+    count, samples = 0, []
+    while count < cards:
+        previous = count
+        start = time.perf_counter()
+        count = discover(scraper, count)
+        samples.append((time.perf_counter() - start) * 1000)
+        # The page stops growing at the result cap
+        if count >= cards or count == previous:
+            break
+        driver.execute_script("loadMore();")
+        # The fixture page clears `busy` once the batch is in the DOM
+        waiter.until(lambda d: d.execute_script("return !busy;"), message="no batch arrived")
+    return samples
+
+
+if __name__ == "__main__":
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    server, base_url = start_server()
+    driver = headless_driver()
+    try:
+        print(f"{'discovery':<10}{'batches':>8}{'first 5 ms':>12}{'last 5 ms':>11}{'last/first':>12}")
+        for name, discover in [("rescan", rescan), ("tag", incremental(False)), ("drop", incremental(True))]:
+            samples = run(driver, base_url, cards, discover)
+            first, last = sum(samples[:5]) / 5, sum(samples[-5:]) / 5
+            print(f"{name:<10}{len(samples):>8}{first:>12.1f}{last:>11.1f}{last / first:>11.1f}x")
+    finally:
+        driver.quit()
+        server.shutdown()
@@ -0,0 +1,42 @@
+# Compares per-field WebDriver extraction against the single execute_script batch on fixture pages
+# Usage: python benchmarks/bench_extract.py [cards per page]   (needs Chrome and chromedriver)
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium.webdriver.common.by import By
+from browser import fixture_scraper, headless_driver
+from fixtures.server import start_server
+
+BATCH = 25
+REPEATS = 3
+
+if __name__ == "__main__":
+    cards = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    server, base_url = start_server()
+    driver = headless_driver()
+    try:
+        scraper = fixture_scraper(driver)
+        driver.get(f"{base_url}/searchresults.html?ss=Australia&nflt=price%3DAUD-171-180-1&initial={cards}")
+        items = driver.find_elements(By.CSS_SELECTOR, "[data-testid='property-card']")
+        batches = [items[i:i + BATCH] for i in range(0, len(items), BATCH)]
+
+        per_field = [scraper.extract_card(x) for x in items]
+        batched = [row for batch in batches for row in scraper.extract_cards(batch)]
+        mismatches = sum(a != b for a, b in zip(per_field, batched))
+        print(f"{len(items)} cards, {mismatches} rows differ between the two paths")
+
+        for name, extract in [("per-field", lambda batch: [scraper.extract_card(x) for x in batch]),
+                              ("batched", scraper.extract_cards)]:
+            samples = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                for batch in batches:
+                    extract(batch)
+                samples.append(time.perf_counter() - start)
+            best = min(samples)
+            print(f"{name:<10} {best * 1000:8.1f} ms total, {best * 1000 / len(items):6.2f} ms per card")
+    finally:
+        driver.quit()
+        server.shutdown()
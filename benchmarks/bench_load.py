@@ -0,0 +1,55 @@
+# Compares startup load time and resident memory of the CSV path against the memory-mapped columnar snapshot
+# Usage: python benchmarks/bench_load.py [rows]
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import snapshot
+from synthetic import generate_listings
+
+# Each loader runs in a fresh interpreter so peak RSS is not polluted by the other
+# (peak RSS is inherited from the parent across fork/exec, so current RSS is read from /proc instead)
+LOADER = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np, pandas as pd
+import schema, snapshot
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+before = rss()
+start = time.perf_counter()
+df = {load}
+elapsed = time.perf_counter() - start
+# Touch the numeric column so mapped pages are counted as they would be after the first /stats request
+df['cost'].sum()
+print(elapsed, (rss() - before) / 2**20)
+"""
+
+
+def run_loader(load):
+    output = subprocess.run([sys.executable, "-c", LOADER.format(root=ROOT, load=load)],
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, rss_mb = output.split()
+    return float(elapsed), float(rss_mb)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "01-01-2026.csv")
+        generate_listings(n_rows).to_csv(csv_file, index=False)
+        target = snapshot.convert_csv(csv_file)
+
+        csv_size = os.path.getsize(csv_file) / 2**20
+        columns_size = sum(os.path.getsize(os.path.join(target, name)) for name in os.listdir(target)) / 2**20
+        print(f"{n_rows:,} rows: CSV {csv_size:.1f} MiB, columnar {columns_size:.1f} MiB")
+
+        print(f"{'loader':<12}{'load s':>10}{'RSS MiB':>10}")
+        for name, load in [("csv", f"schema.apply_schema(pd.read_csv({csv_file!r}))"),
+                           ("columnar", f"snapshot.load_columns({target!r})")]:
+            elapsed, rss_mb = run_loader(load)
+            print(f"{name:<12}{elapsed:>10.2f}{rss_mb:>10.1f}")
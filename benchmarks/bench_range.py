@@ -0,0 +1,61 @@
+# Times /price_range and /best_value queries: boolean mask + full sort versus RangeIndex on a synthetic snapshot
+# Usage: python benchmarks/bench_range.py [rows]
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import schema
+from range_index import RangeIndex
+from synthetic import generate_listings
+
+RANGES = [(100, 101), (100, 200), (50, 500), (0, 100_000)]
+PER_PAGE = 50
+REPEATS = 20
+
+
+def time_ms(fn, repeats=REPEATS):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples)
+
+
+def mask_range(df, low, high):
+    return schema.to_records(df[(df['cost'] >= low) & (df['cost'] <= high)])
+
+
+def index_range(df, index, low, high):
+    return schema.to_records(df.iloc[index.rows_between(low, high)[:PER_PAGE]])
+
+
+def sort_best_value(df, low, high):
+    filtered = df[(df['cost'] >= low) & (df['cost'] <= high)].dropna(subset=['review_score', 'cost'])
+    filtered = filtered.assign(value_score=filtered['review_score'] / filtered['cost'])
+    return schema.to_records(filtered.sort_values('value_score', ascending=False).head(10))
+
+
+def index_best_value(df, index, low, high):
+    rows, scores = index.best_value(low, high, 10)
+    return schema.to_records(df.iloc[rows].assign(value_score=scores))
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = schema.apply_schema(generate_listings(n_rows))
+
+    start = time.perf_counter()
+    index = RangeIndex(df, np.argsort(df['cost'].to_numpy(dtype=float), kind='stable'))
+    print(f"{n_rows:,} rows, index built in {time.perf_counter() - start:.2f}s ({index.nbytes / 2**20:.1f} MiB)")
+
+    print(f"{'range':<16}{'matches':>10}{'mask ms':>10}{'page ms':>10}{'sort top10':>12}{'argpart top10':>15}")
+    for low, high in RANGES:
+        matches = len(index.rows_between(low, high))
+        mask = time_ms(lambda: mask_range(df, low, high), repeats=3)
+        page = time_ms(lambda: index_range(df, index, low, high))
+        full_sort = time_ms(lambda: sort_best_value(df, low, high), repeats=3)
+        top_k = time_ms(lambda: index_best_value(df, index, low, high))
+        print(f"{f'{low}-{high}':<16}{matches:>10,}{mask:>10.1f}{page:>10.2f}{full_sort:>12.1f}{top_k:>15.2f}")
@@ -0,0 +1,49 @@
+# Measures /search index build and lookup times on a synthetic snapshot
+# Usage: python benchmarks/bench_search.py [rows]
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_index import SearchIndex
+from synthetic import generate_listings
+
+QUERIES = ["surry", "hills", "urfer", "grand cove", "heritage retreat", "bondi beach", "kangaroo", "xyzzy"]
+REPEATS = 200
+
+
+def time_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = generate_listings(n_rows)
+    df['cost'] = pd.to_numeric(df['cost'].str.replace(',', ''))
+
+    start = time.perf_counter()
+    index = SearchIndex(df)
+    print(f"Built index over {n_rows:,} rows in {time.perf_counter() - start:.2f}s "
+          f"({len(index.vocabulary):,} tokens, {len(index.grams):,} n-grams)")
+
+    print(f"{'query':<20}{'hits':>10}{'lookup ms':>12}{'ranked ms':>12}")
+    for query in QUERIES:
+        hits = len(index.search(query)[0])
+        lookup = time_ms(lambda: [index.lookup(term) for term in query.split()], REPEATS)
+        ranked = time_ms(lambda: index.search(query), REPEATS)
+        print(f"{query:<20}{hits:>10,}{lookup:>12.3f}{ranked:>12.3f}")
+
+    # The old row-wise DataFrame.apply scan, on a slice so it finishes in reasonable time
+    sample = df.head(100_000)
+    start = time.perf_counter()
+    sample[sample.apply(lambda row: 'surry' in str(row['title']).lower() or 'surry' in str(row['address']).lower(), axis=1)]
+    scan_ms = (time.perf_counter() - start) * 1000
+    print(f"Row-wise apply scan over {len(sample):,} rows: {scan_ms:.1f} ms "
+          f"(~{scan_ms * n_rows / len(sample):.0f} ms extrapolated to {n_rows:,})")
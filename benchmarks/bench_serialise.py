@@ -0,0 +1,47 @@
+# Compares encoding responses with to_records + json.dumps (what jsonify does) against joining rows from a
+# RowCache, for a page of results and for a whole large result set
+# Usage: python benchmarks/bench_serialise.py [rows]
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import row_cache
+import schema
+from synthetic import generate_listings
+
+SIZES = [10, 50, 1000, 100_000]
+
+
+def time_ms(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples)
+
+
+def encode_records(df, rows):
+    return json.dumps(schema.to_records(df.iloc[rows]), separators=(',', ':')).encode()
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = schema.apply_schema(generate_listings(n_rows))
+    start = time.perf_counter()
+    cache = row_cache.RowCache(df)
+    print(f"{n_rows:,} rows, encoded in {time.perf_counter() - start:.2f}s "
+          f"({cache.nbytes / 2**20:.0f} MiB, {'orjson' if row_cache.orjson else 'json'})")
+
+    rows = np.random.default_rng(0).permutation(n_rows)
+    print(f"{'rows':>10}{'records ms':>14}{'cached ms':>12}{'ndjson ms':>12}")
+    for size in SIZES:
+        subset = rows[:size]
+        repeats = 3 if size >= 100_000 else 50
+        records = time_ms(lambda: encode_records(df, subset), repeats)
+        cached = time_ms(lambda: cache.array(subset), repeats)
+        ndjson = time_ms(lambda: b'\n'.join(cache.rows(subset)), repeats)
+        print(f"{size:>10,}{records:>14.2f}{cached:>12.2f}{ndjson:>12.2f}")
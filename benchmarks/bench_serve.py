@@ -0,0 +1,129 @@
+# Load test for serve.py: throughput and latency at each worker count, plus how much of each worker's
+# memory is still shared with the others after serving
+# Usage: python benchmarks/bench_serve.py [rows] [workers ...]
+import http.client
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import snapshot
+from synthetic import generate_listings
+
+DATE = "01-01-2026"
+PORT = 5099
+DURATION = 10.0
+CLIENTS = 8
+
+REQUESTS = [
+    "/cheapest?page=3",
+    "/cheapest?then_by=review_score",
+    "/search?q=surry%20hills",
+    "/search?q=harbour",
+    "/price_range?min=100&max=200&page=5",
+    "/best_value?min=100&max=300",
+    "/location_analysis?location=Sydney",
+    "/stats",
+]
+
+
+def client(deadline, results):
+    latencies, errors = [], 0
+    rng = random.Random(os.getpid())
+    while time.monotonic() < deadline:
+        path = rng.choice(REQUESTS)
+        start = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status != 200:
+                errors += 1
+                continue
+        except OSError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    results.put((latencies, errors))
+
+
+def wait_until_ready(process, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("serve.py exited before it was ready")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+            connection.request("GET", "/stats")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("serve.py did not become ready")
+
+
+def memory_kib(pid):
+    # Proportional set size and private pages of one process
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields.get("Rss", 0), fields.get("Pss", 0), fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+
+
+def run(directory, workers):
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "serve.py"), DATE, "--workers", str(workers),
+                                "--port", str(PORT)], cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(process)
+        results = multiprocessing.Queue()
+        deadline = time.monotonic() + DURATION
+        clients = [multiprocessing.Process(target=client, args=(deadline, results)) for _ in range(CLIENTS)]
+        for c in clients:
+            c.start()
+        outcomes = [results.get() for _ in clients]
+        for c in clients:
+            c.join()
+
+        pids = subprocess.run(["pgrep", "-P", str(process.pid)], capture_output=True, text=True).stdout.split()
+        memory = np.array([memory_kib(pid) for pid in pids]) / 1024
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = np.concatenate([np.array(l, dtype=float) for l, _ in outcomes])
+    errors = sum(e for _, e in outcomes)
+    return len(latencies) / DURATION, np.percentile(latencies, 50), np.percentile(latencies, 99), errors, memory
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    worker_counts = [int(w) for w in sys.argv[2:]] or [1, 2, 4]
+    if max(worker_counts) > (os.cpu_count() or 1):
+        print(f"Note: only {os.cpu_count()} CPUs; workers beyond that (and the {CLIENTS} load clients) share them\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "output"))
+        csv_file = os.path.join(directory, "output", f"{DATE}.csv")
+        generate_listings(n_rows).to_csv(csv_file, index=False)
+        snapshot.convert_csv(csv_file)
+
+        print(f"{n_rows:,} rows, {CLIENTS} clients, {DURATION:.0f}s per run")
+        print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"
+              f"{'RSS MiB':>10}{'PSS MiB':>10}{'private MiB':>13}")
+        for workers in worker_counts:
+            throughput, p50, p99, errors, memory = run(directory, workers)
+            # Per worker averages; PSS splits shared pages between the processes sharing them
+            rss, pss, private = memory.mean(axis=0)
+            print(f"{workers:>8}{throughput:>10.1f}{p50:>10.1f}{p99:>10.1f}{errors:>8}"
+                  f"{rss:>10.0f}{pss:>10.0f}{private:>13.0f}")
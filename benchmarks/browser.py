@@ -0,0 +1,23 @@
+# Shared helpers for benchmarks that drive a real browser against the local fixture server
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from selenium import webdriver
+from main import BookingScraper
+
+
+def headless_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,1024")
+    # Network events for NetworkMonitor, which plain Selenium drivers deliver through the performance log
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return webdriver.Chrome(options=options)
+
+
+def fixture_scraper(driver, block_policy=None):
+    # A BookingScraper on the given driver that writes to a throwaway CSV
+    csv_file = os.path.join(tempfile.mkdtemp(), "bench.csv")
+    return BookingScraper(csv_file, driver=driver, block_policy=block_policy)
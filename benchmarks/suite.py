@@ -0,0 +1,238 @@
+# Benchmark suite: times every API route, snapshot loading, and the scraper's extraction, dedupe/write and
+# scroll loops, and compares a run with a saved baseline so regressions show up before they ship
+#
+# API cases run against a synthetic snapshot (see synthetic.py) through Flask's test client; the change
+# endpoints compare it with a synthetic next day, indexed before anything is timed. Scraper cases
+# use pages from the local fixture server (fixtures/server.py); the browser-driven ones (batched card
+# extraction and the scroll loop) need Chrome and chromedriver and only run with --browser.
+#
+# Usage: python benchmarks/suite.py [--rows 10k|1m|10m|N] [--only PATTERN] [--browser]
+#                                   [--save results.json] [--compare baseline.json] [--threshold 0.10]
+# --compare exits with status 1 when any case is slower than the baseline by more than the threshold.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import app
+import page_parser
+import snapshot
+from csv_writer import BufferedCsvWriter
+from dedupe import KeySet, listing_key
+from fixtures.server import RESULT_CAP, bucket_listings, start_server
+from synthetic import parse_rows, write_next_day, write_snapshot
+
+DATE = "01-01-2026"
+# A second scrape, so the change endpoints have a previous snapshot to compare with
+NEXT_DATE = "02-01-2026"
+# $171-$180 is over the result cap, so every card position is filled; $500-$509 fits in one scroll pass
+FIXTURE_PAGE = "/searchresults.html?ss=Australia&nflt=price%3DAUD-171-180-1&initial={cards}"
+SCROLL_BUCKET = (500, 509)
+PARSED_CARDS = 500
+EXTRACTED_CARDS = 100
+
+
+def measure(fn, repeats):
+    fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": float(np.median(samples)), "min_ms": float(np.min(samples)), "repeats": repeats}
+
+
+def api_cases(client, df):
+    title = df['title'].iloc[0].replace(' ', '%20')
+    url = urllib.parse.quote(df['url'].iloc[0], safe='')
+
+    def get(path, headers=None):
+        def request():
+            response = client.get(path, headers=headers)
+            response.get_data()
+            assert response.status_code == 200, (path, response.status_code)
+        return request
+
+    return [
+        ("api", "/cheapest", get("/cheapest?page=20"), 200),
+        ("api", "/cheapest then_by", get("/cheapest?then_by=review_score"), 200),
+        ("api", "/stats", get("/stats"), 20),
+        ("api", "/search", get("/search?q=surry%20hills"), 50),
+        ("api", "/search partial", get("/search?q=urfer"), 50),
+        ("api", "/price_range", get("/price_range?min=100&max=200&page=3"), 200),
+        ("api", "/price_range ndjson", get("/price_range?min=150&max=160", {"Accept": "application/x-ndjson"}), 20),
+        ("api", "/best_value", get("/best_value?min=100&max=300"), 50),
+        ("api", "/location_analysis", get("/location_analysis?location=Sydney"), 200),
+        ("api", "/location_analysis substring", get("/location_analysis?location=beach"), 20),
+        ("api", "/property_percentile", get(f"/property_percentile?name={title}"), 50),
+        ("api", "/metrics", get("/metrics"), 200),
+        ("api", "/movers", get("/movers"), 200),
+        ("api", "/movers down", get("/movers?direction=down"), 200),
+        ("api", "/new_listings", get("/new_listings?page=3"), 200),
+        ("api", "/delisted", get("/delisted?page=3"), 200),
+        ("api", "/price_history", get(f"/price_history?url={url}"), 200),
+    ]
+
+
+def scraper_cases(base_url, directory):
+    with urllib.request.urlopen(base_url + FIXTURE_PAGE.format(cards=PARSED_CARDS)) as response:
+        page_source = response.read().decode("utf-8")
+    rows = page_parser.parse_page(page_source, base_url=base_url)
+    csv_file = os.path.join(directory, "rows.csv")
+
+    def dedupe_and_write():
+        # What scrape() and append_to_csv() do with each batch of extracted rows
+        listings = KeySet()
+        writer = BufferedCsvWriter(csv_file, page_parser.FIELDNAMES)
+        writer.write([row for row in rows if listings.add(listing_key(row))])
+        writer.close()
+        os.remove(csv_file)
+
+    return [
+        ("scraper", f"parse page ({PARSED_CARDS} cards)", lambda: page_parser.parse_page(page_source, base_url=base_url), 10),
+        ("scraper", f"dedupe + write ({PARSED_CARDS} rows)", dedupe_and_write, 50),
+    ]
+
+
+def browser_cases(base_url, stack):
+    from selenium.webdriver.common.by import By
+    from browser import fixture_scraper, headless_driver
+    from waits import Waiter, WaitPolicy
+
+    driver = headless_driver()
+    stack.callback(driver.quit)
+    scraper = fixture_scraper(driver)
+    scraper.waiter = Waiter(driver, WaitPolicy(jitter=(0, 0), settle=0.5, poll=0.05))
+
+    def extract_cards():
+        driver.get(base_url + FIXTURE_PAGE.format(cards=EXTRACTED_CARDS))
+        items = driver.find_elements(By.CSS_SELECTOR, "[data-testid='property-card']")
+        return lambda: scraper.extract_cards(items)
+
+    lower, upper = SCROLL_BUCKET
+    total = min(len(bucket_listings(lower, upper, 1.0)), RESULT_CAP)
+
+    def scroll_bucket():
+        # A fresh page and dedupe store each time, so every card is read and written again
+        driver.get(f"{base_url}/searchresults.html?ss=Australia&nflt=price%3DAUD-{lower}-{upper}-1")
+        scraper.listings = KeySet()
+        with contextlib.redirect_stdout(io.StringIO()):
+            scraper._scroll_page(total)
+
+    return [
+        ("browser", f"extract_cards ({EXTRACTED_CARDS} cards)", extract_cards(), 5),
+        ("browser", f"scroll loop ({total} cards)", scroll_bucket, 3),
+    ]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline, threshold):
+    # Prints one line per case; returns the cases slower than the baseline by more than the threshold.
+    # Runs are compared on their fastest sample, which is far less noisy than the median on a busy machine.
+    regressions = []
+    header = f"{'group':<9}{'case':<36}{'median ms':>11}{'min ms':>10}"
+    if baseline:
+        header += f"{'baseline min':>14}{'change':>9}"
+    print(header)
+    for name, result in results.items():
+        group, case = name.split(":", 1)
+        line = f"{group:<9}{case:<36}{result['median_ms']:>11.2f}{result['min_ms']:>10.2f}"
+        previous = baseline.get(name) if baseline else None
+        if previous:
+            change = result['min_ms'] / previous['min_ms'] - 1
+            line += f"{previous['min_ms']:>14.2f}{change:>+9.0%}"
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Time the API routes and scraper loops, optionally against a baseline.")
+    parser.add_argument('--rows', default="1m", help="Synthetic snapshot size: 10k, 1m, 10m or a number of rows.")
+    parser.add_argument('--only', default=None, help="Only run cases whose name contains this text.")
+    parser.add_argument('--browser', action='store_true', help="Also run the cases that drive Chrome.")
+    parser.add_argument('--save', metavar='FILE', help="Write the results as JSON (e.g. to use as a baseline).")
+    parser.add_argument('--compare', metavar='FILE', help="Compare with results saved by an earlier --save.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Slowdown that counts as a regression (0.10 = 10%%).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    n_rows = parse_rows(args.rows)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved["meta"]["rows"] != n_rows:
+            print(f"Note: the baseline was run on {saved['meta']['rows']:,} rows, this run uses {n_rows:,}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.ExitStack() as stack:
+        # app.py reads snapshots from output/ relative to the working directory
+        os.makedirs(os.path.join(directory, "output"))
+        csv_file = os.path.join(directory, "output", f"{DATE}.csv")
+        print(f"Generating {n_rows:,} synthetic listings...")
+        write_snapshot(csv_file, n_rows)
+        snapshot.convert_csv(csv_file)
+        write_next_day(csv_file, os.path.join(directory, "output", f"{NEXT_DATE}.csv"))
+        os.chdir(directory)
+
+        app.snapshots = app.SnapshotCache(app.DEFAULT_CACHE_MB * 2**20, default_date=DATE)
+        # The API indexes scrapes at startup, not per request, so the index is built before timing
+        print("Indexing both snapshots for the change endpoints...")
+        app.change_index = app.ChangeIndex()
+        app.change_index.update()
+        loaded = app.snapshots.get()
+        server, base_url = start_server()
+        stack.callback(server.shutdown)
+
+        cases = [("load", "snapshot (columnar + indexes)", lambda: app.Snapshot(DATE), 3)]
+        cases += api_cases(app.app.test_client(), loaded.df)
+        cases += scraper_cases(base_url, directory)
+        if args.browser:
+            cases += browser_cases(base_url, stack)
+
+        for group, case, fn, repeats in cases:
+            name = f"{group}:{case}"
+            if args.only and args.only not in name:
+                continue
+            results[name] = measure(fn, repeats)
+        os.chdir(ROOT)
+
+    print(f"\n{n_rows:,} rows, git {git_revision() or 'unknown'}")
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        meta = {"rows": n_rows, "git": git_revision(), "python": platform.python_version(),
+                "machine": platform.machine(), "cpus": os.cpu_count(), "when": datetime.now().isoformat(timespec='seconds')}
+        with open(args.save, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
@@ -0,0 +1,100 @@
+# Generates synthetic snapshots shaped like the scraper's output/<DD-MM-YYYY>.csv files
+# Standard sizes are 10k (quick checks), 1m (the default for benchmarks) and 10m (stress); large
+# snapshots are generated and written in chunks so memory stays bounded.
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+PREFIXES = ["Harbour", "Beach", "City", "Garden", "Park", "Ocean", "Bay", "River", "Mountain", "Valley",
+            "Sunset", "Royal", "Grand", "Coastal", "Heritage", "Bush", "Outback", "Lakeside", "Central", "Island"]
+NAMES = ["View", "Side", "Point", "Haven", "Retreat", "Escape", "Cove", "Terrace", "House", "Lodge",
+         "Nest", "Palms", "Sands", "Heights", "Gardens", "Quarter", "Crossing", "Springs", "Ridge", "Shores"]
+KINDS = ["Hotel", "Motel", "Apartments", "Resort", "Guest House", "Hostel", "Villa", "Cottage", "Suites", "Inn"]
+LOCALITIES = {
+    "Sydney": ["Sydney CBD", "Surry Hills", "Darlinghurst", "Bondi Beach", "Manly", "Parramatta", "Newtown", "Pyrmont"],
+    "Melbourne": ["Melbourne CBD", "Fitzroy", "Southbank", "St Kilda", "Richmond", "Docklands", "Carlton"],
+    "Brisbane": ["Brisbane CBD", "Fortitude Valley", "South Brisbane", "Kangaroo Point", "New Farm"],
+    "Gold Coast": ["Surfers Paradise", "Broadbeach", "Burleigh Heads", "Coolangatta", "Main Beach"],
+    "Perth": ["Perth CBD", "Fremantle", "Northbridge", "Scarborough", "Cottesloe"],
+    "Adelaide": ["Adelaide CBD", "Glenelg", "North Adelaide", "Hahndorf"],
+    "Hobart": ["Hobart CBD", "Battery Point", "Sandy Bay"],
+    "Cairns": ["Cairns City", "Palm Cove", "Port Douglas", "Trinity Beach"],
+    "Darwin": ["Darwin City", "Larrakeyah", "Fannie Bay"],
+    "Byron Bay": ["Byron Bay", "Suffolk Park"],
+}
+ROOM_TYPES = ["Double Room", "Queen Room", "Deluxe King Room", "Studio", "One-Bedroom Apartment",
+              "Two-Bedroom Apartment", "Twin Room", "Family Room", "Bed in Dormitory", "Holiday Home"]
+
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK_ROWS = 1_000_000
+
+
+def parse_rows(text):
+    # "10k", "1m", "10m" or a plain number of rows
+    return SIZES.get(text.lower()) or int(text)
+
+
+def generate_listings(n_rows, seed=0, start=0):
+    # `start` numbers the URLs, so chunks of one snapshot (each with its own seed) never share a listing
+    rng = np.random.default_rng(seed)
+    regions = np.array([region for region, places in LOCALITIES.items() for _ in places])
+    places = np.array([place for places in LOCALITIES.values() for place in places])
+    where = rng.integers(0, len(places), n_rows)
+
+    # Prefix/name/kind combinations plus a short code keep most titles distinct without making every token unique
+    title = (pd.Series(rng.choice(PREFIXES, n_rows)) + " " + rng.choice(NAMES, n_rows) + " "
+             + rng.choice(KINDS, n_rows) + " " + pd.Series(rng.integers(1, 999, n_rows)).astype(str))
+    address = pd.Series(places[where]) + ", " + regions[where]
+
+    # Nightly rates are roughly log-normal around $180 with a long luxury tail
+    cost = np.clip(rng.lognormal(np.log(180), 0.6, n_rows), 20, 20000).astype(int)
+    is_new = rng.random(n_rows) < 0.08
+    score = np.round(np.clip(rng.normal(8.2, 0.9, n_rows), 1, 10), 1)
+    reviews = np.where(is_new, 0, rng.geometric(1 / 300, n_rows))
+
+    return pd.DataFrame({
+        "title": title,
+        "address": address,
+        "cost": pd.Series(cost).map("{:,}".format),
+        "review_score": np.where(is_new, "New to Booking.com", score.astype(str)),
+        "number_of_reviews": pd.Series(reviews).map("{:,}".format),
+        "room_type": rng.choice(ROOM_TYPES, n_rows),
+        "url": "https://www.booking.com/hotel/au/synthetic-" + pd.Series(np.arange(start, start + n_rows)).astype(str) + ".html",
+    })
+
+
+def write_snapshot(csv_file, n_rows, seed=0, chunk_rows=CHUNK_ROWS):
+    if n_rows <= chunk_rows:
+        generate_listings(n_rows, seed).to_csv(csv_file, index=False)
+        return
+    for chunk, start in enumerate(range(0, n_rows, chunk_rows)):
+        rows = generate_listings(min(chunk_rows, n_rows - start), seed + chunk, start)
+        rows.to_csv(csv_file, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def write_next_day(csv_file, next_file, seed=1, repriced=0.05, churn=0.02):
+    # The following day's scrape of csv_file: a share of listings repriced, some delisted and as many new
+    # ones listed, so the change index (changes.py) has movers, new and delisted listings to serve
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    n_rows = len(df)
+    df = df[rng.random(n_rows) >= churn].reset_index(drop=True)
+    moved = rng.random(len(df)) < repriced
+    cost = df.loc[moved, 'cost'].str.replace(',', '').astype(int) * rng.uniform(0.8, 1.25, int(moved.sum()))
+    df.loc[moved, 'cost'] = cost.clip(20).astype(int).map("{:,}".format)
+    new = generate_listings(n_rows - len(df), seed, start=n_rows)
+    pd.concat([df, new]).to_csv(next_file, index=False)
+
+
+if __name__ == "__main__":
+    # Usage: python benchmarks/synthetic.py <rows: 10k|1m|10m|N> <DD-MM-YYYY>
+    if len(sys.argv) != 3:
+        print("Usage: python benchmarks/synthetic.py <rows: 10k|1m|10m|N> <DD-MM-YYYY>")
+        sys.exit(1)
+    n_rows, date = parse_rows(sys.argv[1]), sys.argv[2]
+    os.makedirs("output", exist_ok=True)
+    csv_file = f"output/{date}.csv"
+    write_snapshot(csv_file, n_rows)
+    print(f"Wrote {n_rows} synthetic listings to {csv_file}")
@@ -0,0 +1,306 @@
+# Cross-snapshot change index: how each listing's price, review score and review count moved between
+# consecutive scrapes
+#
+# output/changes.sqlite holds, per listing (keyed on its normalised URL, like dedupe.listing_key):
+#     listings       latest title, address and URL, and the first and last day the listing was seen
+#     observations   cost, review score and review count on every day it was scraped (its price history)
+#     changes        per snapshot, the difference from the snapshot before it: listings whose values moved
+#                    ('changed'), appeared ('new') or disappeared ('delisted'), with both values and the delta
+#     snapshots      the snapshots indexed so far, and the CSV mtime and size they were indexed from
+# Each snapshot is indexed once, when its CSV is first seen: main.py indexes a scrape when it finishes,
+# and the API indexes unindexed snapshots at startup and then from a background thread. Diffs are computed at that point, so a query
+# only reads the rows it returns. A snapshot that arrives out of date order is slotted in, and the diff
+# of the snapshot after it is recomputed. Days are stored as YYYY-MM-DD so they sort.
+#
+# Usage: python changes.py [--rebuild]
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from operator import itemgetter
+from datetime import datetime
+import snapshot
+from dedupe import listing_key
+from schema import to_python
+
+CHANGES_DB = "output/changes.sqlite"
+
+# Seconds between the API's checks for new or changed scrapes
+REFRESH_INTERVAL = 60
+
+CSV_PATTERN = re.compile(r'^(\d{2}-\d{2}-\d{4})\.csv$')
+
+# Fields that are compared between snapshots, and the column holding each one's delta
+TRACKED = {'cost': 'cost_delta', 'review_score': 'review_score_delta', 'number_of_reviews': 'number_of_reviews_delta'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (day TEXT PRIMARY KEY, rows INTEGER, mtime REAL, size INTEGER);
+CREATE TABLE IF NOT EXISTS listings (key INTEGER PRIMARY KEY, url TEXT, title TEXT, address TEXT,
+                                     first_seen TEXT, last_seen TEXT);
+CREATE TABLE IF NOT EXISTS observations (key INTEGER, day TEXT, cost REAL, review_score REAL,
+                                         number_of_reviews INTEGER, PRIMARY KEY (key, day)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_day ON observations (day);
+CREATE TABLE IF NOT EXISTS changes (day TEXT, key INTEGER, kind TEXT, previous_day TEXT,
+                                    cost REAL, previous_cost REAL, cost_delta REAL,
+                                    review_score REAL, previous_review_score REAL, review_score_delta REAL,
+                                    number_of_reviews INTEGER, previous_number_of_reviews INTEGER,
+                                    number_of_reviews_delta INTEGER,
+                                    PRIMARY KEY (day, key)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS changes_by_kind ON changes (day, kind);
+"""
+
+# Inserts the diff between :previous and :day; listings present on both days are only kept if a value moved
+DIFF = """
+INSERT INTO changes
+SELECT :day, key, kind, :previous, cost, previous_cost, cost - previous_cost,
+       review_score, previous_review_score, review_score - previous_review_score,
+       number_of_reviews, previous_number_of_reviews, number_of_reviews - previous_number_of_reviews
+FROM (
+    SELECT current.key, CASE WHEN previous.key IS NULL THEN 'new' ELSE 'changed' END AS kind,
+           current.cost, previous.cost AS previous_cost,
+           current.review_score, previous.review_score AS previous_review_score,
+           current.number_of_reviews, previous.number_of_reviews AS previous_number_of_reviews
+    FROM observations AS current
+    LEFT JOIN observations AS previous ON previous.key = current.key AND previous.day = :previous
+    WHERE current.day = :day AND (previous.key IS NULL OR current.cost IS NOT previous.cost
+                                  OR current.review_score IS NOT previous.review_score
+                                  OR current.number_of_reviews IS NOT previous.number_of_reviews)
+    UNION ALL
+    SELECT previous.key, 'delisted', NULL, previous.cost, NULL, previous.review_score, NULL, previous.number_of_reviews
+    FROM observations AS previous
+    LEFT JOIN observations AS current ON current.key = previous.key AND current.day = :day
+    WHERE previous.day = :previous AND current.key IS NULL
+)
+"""
+
+LISTING_COLUMNS = "listings.title, listings.address, listings.url"
+CHANGE_COLUMNS = ("changes.previous_day, changes.cost, changes.previous_cost, changes.cost_delta, "
+                  "changes.review_score, changes.previous_review_score, changes.review_score_delta, "
+                  "changes.number_of_reviews, changes.previous_number_of_reviews, changes.number_of_reviews_delta")
+
+
+def iso_day(date):
+    return datetime.strptime(date, '%d-%m-%Y').strftime('%Y-%m-%d')
+
+
+def display_date(day):
+    return datetime.strptime(day, '%Y-%m-%d').strftime('%d-%m-%Y') if day else None
+
+
+def frame_keys(df):
+    # listing_key of every row, from the URL or (without one) the title and address
+    columns = {name: to_python(df[name]) if name in df.columns else [None] * len(df) for name in ('url', 'title', 'address')}
+    return [listing_key({'url': url, 'title': title, 'address': address})
+            for url, title, address in zip(columns['url'], columns['title'], columns['address'])]
+
+
+class ChangeIndex:
+    def __init__(self, path=CHANGES_DB, output_dir="output"):
+        self.path = path
+        self.output_dir = output_dir
+        self.lock = threading.RLock()
+        self.db = None
+        self.pid = None
+        # {day: (mtime, size)} of CSVs that could not be indexed, skipped until the file changes
+        self.failed = {}
+
+    def connection(self):
+        # SQLite connections must not cross a fork, so each process (e.g. serve.py worker) opens its own
+        if self.db is None or self.pid != os.getpid():
+            self.db = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            # A 1M-listing snapshot touches a few hundred MiB of pages while it is indexed
+            self.db.execute("PRAGMA cache_size=-262144")
+            self.db.executescript(SCHEMA)
+            self.db.row_factory = sqlite3.Row
+            self.pid = os.getpid()
+        return self.db
+
+    def pending(self):
+        # Snapshots whose CSV is not indexed, or has changed since it was; oldest first
+        db = self.connection()
+        indexed = {row['day']: (row['mtime'], row['size']) for row in db.execute("SELECT day, mtime, size FROM snapshots")}
+        found = []
+        if os.path.isdir(self.output_dir):
+            for name in os.listdir(self.output_dir):
+                match = CSV_PATTERN.match(name)
+                if not match:
+                    continue
+                try:
+                    day = iso_day(match.group(1))
+                except ValueError:
+                    continue
+                stat = os.stat(os.path.join(self.output_dir, name))
+                if indexed.get(day) != (stat.st_mtime, stat.st_size):
+                    found.append((day, match.group(1), stat.st_mtime, stat.st_size))
+        return sorted(found)
+
+    def update(self):
+        # Indexes every pending snapshot; returns the dates indexed. A CSV that cannot be indexed (e.g. one
+        # missing a tracked column) is reported and skipped, so the other snapshots are still indexed
+        with self.lock:
+            indexed = []
+            for day, date, mtime, size in self.pending():
+                if self.failed.get(day) == (mtime, size):
+                    continue
+                try:
+                    df = snapshot.load_frame(os.path.join(self.output_dir, f"{date}.csv"))
+                    self.add(day, df, mtime, size)
+                except Exception as e:
+                    print(f"Could not index {date} in the change index: {e}")
+                    self.failed[day] = (mtime, size)
+                    continue
+                self.failed.pop(day, None)
+                indexed.append(date)
+            return indexed
+
+    def keep_current(self, interval=REFRESH_INTERVAL):
+        # Indexes new and changed scrapes every `interval` seconds, forever
+        while True:
+            time.sleep(interval)
+            try:
+                self.update()
+            except Exception as e:
+                print(f"Change index refresh failed: {e}")
+
+    def refresh(self, interval=REFRESH_INTERVAL):
+        # Runs keep_current() on a daemon thread. The API gives it its own ChangeIndex, so requests keep
+        # reading while a large snapshot is indexed. serve.py runs keep_current() in a process of its own
+        # instead, as it forks workers and must not hold threads when it does
+        thread = threading.Thread(target=self.keep_current, args=(interval,), name="change-index-refresh", daemon=True)
+        thread.start()
+        return thread
+
+    def add(self, day, df, mtime=None, size=None):
+        keys = frame_keys(df)
+        values = list(zip(keys, [day] * len(keys), to_python(df['cost']), to_python(df['review_score']),
+                          to_python(df['number_of_reviews'])))
+        listings = list(zip(keys, to_python(df['url']), to_python(df['title']), to_python(df['address'])))
+        # Keys are hashes, so rows inserted in key order walk the B-trees instead of jumping between pages
+        values.sort(key=itemgetter(0))
+        listings.sort(key=itemgetter(0))
+
+        with self.lock:
+            db = self.connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process (e.g. a second serve.py worker) may have indexed this CSV while we waited
+                if mtime is not None and db.execute("SELECT 1 FROM snapshots WHERE day = ? AND mtime = ? AND size = ?",
+                                                    (day, mtime, size)).fetchone():
+                    db.execute("ROLLBACK")
+                    return
+                db.execute("DELETE FROM observations WHERE day = ?", (day,))
+                db.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?)", values)
+                # The newest snapshot a listing appears in supplies its title, address and URL
+                db.executemany("""
+                    INSERT INTO listings VALUES (?1, ?2, ?3, ?4, ?5, ?5)
+                    ON CONFLICT (key) DO UPDATE SET
+                        url = CASE WHEN ?5 >= last_seen THEN ?2 ELSE url END,
+                        title = CASE WHEN ?5 >= last_seen THEN ?3 ELSE title END,
+                        address = CASE WHEN ?5 >= last_seen THEN ?4 ELSE address END,
+                        first_seen = min(first_seen, ?5), last_seen = max(last_seen, ?5)
+                """, [listing + (day,) for listing in listings])
+                db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", (day, len(df), mtime, size))
+
+                previous = db.execute("SELECT max(day) FROM snapshots WHERE day < ?", (day,)).fetchone()[0]
+                following = db.execute("SELECT min(day) FROM snapshots WHERE day > ?", (day,)).fetchone()[0]
+                self.diff(db, previous, day)
+                if following:
+                    self.diff(db, day, following)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def diff(self, db, previous, day):
+        db.execute("DELETE FROM changes WHERE day = ?", (day,))
+        # The first snapshot has nothing to be compared with
+        if previous:
+            db.execute(DIFF, {'day': day, 'previous': previous})
+
+    def days(self):
+        with self.lock:
+            return [row['day'] for row in self.connection().execute("SELECT day FROM snapshots ORDER BY day")]
+
+    def resolve(self, date=None):
+        # The indexed day for a DD-MM-YYYY date (the newest by default), or None if it is not indexed
+        days = self.days()
+        if date is None:
+            return days[-1] if days else None
+        day = iso_day(date)
+        return day if day in days else None
+
+    def movers(self, day, field='cost', direction='any', limit=20):
+        # Listings whose `field` moved the most since the previous snapshot; direction is 'up', 'down' or 'any'
+        delta = TRACKED[field]
+        where = {'up': f"AND {delta} > 0", 'down': f"AND {delta} < 0", 'any': f"AND {delta} != 0"}[direction]
+        order = {'up': f"{delta} DESC", 'down': f"{delta} ASC", 'any': f"abs({delta}) DESC"}[direction]
+        with self.lock:
+            rows = self.connection().execute(f"""
+                SELECT {LISTING_COLUMNS}, {CHANGE_COLUMNS} FROM changes JOIN listings USING (key)
+                WHERE changes.day = ? AND changes.kind = 'changed' {where}
+                ORDER BY {order}, changes.key LIMIT ?
+            """, (day, limit)).fetchall()
+        return [self.change_record(row) for row in rows]
+
+    def listed(self, day, kind, page, per_page):
+        # One page of the listings that were new or delisted in a snapshot; returns (records, total)
+        with self.lock:
+            db = self.connection()
+            total = db.execute("SELECT count(*) FROM changes WHERE day = ? AND kind = ?", (day, kind)).fetchone()[0]
+            rows = db.execute(f"""
+                SELECT {LISTING_COLUMNS}, {CHANGE_COLUMNS} FROM changes JOIN listings USING (key)
+                WHERE changes.day = ? AND changes.kind = ?
+                ORDER BY changes.key LIMIT ? OFFSET ?
+            """, (day, kind, per_page, (page - 1) * per_page)).fetchall()
+        return [self.change_record(row) for row in rows], total
+
+    def history(self, url):
+        # The listing with this URL and its values on every day it was scraped, or None if it was never seen
+        key = listing_key({'url': url})
+        with self.lock:
+            db = self.connection()
+            listing = db.execute("SELECT * FROM listings WHERE key = ?", (key,)).fetchone()
+            if listing is None:
+                return None
+            observations = db.execute("SELECT day, cost, review_score, number_of_reviews FROM observations "
+                                      "WHERE key = ? ORDER BY day", (key,)).fetchall()
+        return {
+            'title': listing['title'],
+            'address': listing['address'],
+            'url': listing['url'],
+            'first_seen': display_date(listing['first_seen']),
+            'last_seen': display_date(listing['last_seen']),
+            'history': [{'date': display_date(row['day']), 'cost': row['cost'], 'review_score': row['review_score'],
+                         'number_of_reviews': row['number_of_reviews']} for row in observations],
+        }
+
+    @staticmethod
+    def change_record(row):
+        record = dict(row)
+        record['previous_date'] = display_date(record.pop('previous_day'))
+        return record
+
+    def close(self):
+        with self.lock:
+            if self.db is not None and self.pid == os.getpid():
+                self.db.close()
+            self.db = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index every scrape in output/ into the cross-snapshot change index.")
+    parser.add_argument('--rebuild', action='store_true', help="Discard the index and build it again from every CSV.")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(CHANGES_DB + suffix):
+                os.remove(CHANGES_DB + suffix)
+    index = ChangeIndex()
+    indexed = index.update()
+    print(f"Indexed {len(indexed)} snapshot(s): {', '.join(indexed) or 'none pending'}")
+    index.close()
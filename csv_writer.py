@@ -0,0 +1,47 @@
+# Long-lived CSV appender for the scraper
+#
+# The file stays open for the whole run behind a large buffer. Rows reach the OS every FLUSH_ROWS rows
+# or FLUSH_SECONDS seconds (checked as rows arrive), and whenever flush(), sync() or close() is called.
+import csv
+import os
+import time
+
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 5.0
+BUFFER_BYTES = 1 << 20
+
+
+class BufferedCsvWriter:
+    def __init__(self, csv_file, fieldnames, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        # Appends to an existing file; whoever created it has already written the header
+        self.csv_file = csv_file
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.file = open(csv_file, mode='a', newline='', encoding='utf-8', buffering=BUFFER_BYTES)
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.unflushed += len(rows)
+        if self.unflushed >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def sync(self):
+        # Flushes and fsyncs, returning the file length: always on a row boundary
+        if self.file.closed:
+            return os.path.getsize(self.csv_file)
+        self.flush()
+        os.fsync(self.file.fileno())
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
@@ -0,0 +1,102 @@
+# Bounded-memory duplicate detection for scraped listings
+#
+# A listing is identified by its normalised detail-page URL (host and path, without the query string or
+# language suffix), so the same property seen again at a different price or in another sort pass is
+# still a duplicate. The URL is reduced to a signed 64-bit hash, which also fits an SQLite INTEGER key
+# in the scrape journal. At a million listings the chance of any two colliding is about 3 in 100 million.
+#
+# KeySet keeps the hashes exactly. BloomFilter trades a stated false-positive rate (a new listing
+# wrongly treated as already seen) for a fixed footprint of a few bits per listing.
+import hashlib
+import math
+import re
+import sys
+from urllib.parse import urlsplit
+
+# The filter is sized for this many listings; past it the false-positive rate climbs above the stated one
+BLOOM_CAPACITY = 2_000_000
+BLOOM_ERROR_RATE = 1e-6
+
+LANGUAGE_SUFFIX = re.compile(r"(\.[a-z]{2}(-[a-z]{2})?)?\.html$")
+
+
+def normalise_url(url):
+    parts = urlsplit(url.strip().lower())
+    return parts.netloc + LANGUAGE_SUFFIX.sub("", parts.path.rstrip("/"))
+
+
+def listing_key(row):
+    # Cards without a link fall back to their title and address
+    url = row.get("url")
+    identity = normalise_url(url) if url else f"{row.get('title')}\n{row.get('address')}"
+    return int.from_bytes(hashlib.blake2b(identity.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class KeySet:
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+
+    def add(self, key):
+        # Returns True if the key had not been seen before
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def update(self, keys):
+        self.keys.update(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def describe(self):
+        nbytes = sys.getsizeof(self.keys) + len(self.keys) * sys.getsizeof(2 ** 62)
+        return f"exact, {len(self.keys)} listings in {nbytes / 2 ** 20:.1f} MiB"
+
+
+class BloomFilter:
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, keys=()):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self.update(keys)
+
+    def _positions(self, key):
+        # Double hashing over the two halves of the 64-bit key
+        low, high = key & 0xFFFFFFFF, ((key >> 32) & 0xFFFFFFFF) | 1
+        return ((low + i * high) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        # Returns True if the key was definitely not seen before
+        new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                new = True
+                self.bits[byte] |= 1 << bit
+        self.count += new
+        return new
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return self.count
+
+    def false_positive_rate(self):
+        # Expected rate at the current fill, rather than at capacity
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def describe(self):
+        return (f"bloom, {self.count} listings in {len(self.bits) / 2 ** 20:.1f} MiB, false-positive rate "
+                f"{self.false_positive_rate():.1e} now, {self.error_rate:.0e} at {self.capacity} listings")
+
+
+def make_store(kind="exact", error_rate=BLOOM_ERROR_RATE, capacity=BLOOM_CAPACITY):
+    if kind == "bloom":
+        return BloomFilter(capacity, error_rate)
+    return KeySet()
@@ -0,0 +1,295 @@
+# Detail-page enrichment: fetches each listing's detail page for its full street address, off the
+# card-scraping loop
+#
+# Cards only show a suburb and city; the full address is on the listing's own page. Detail URLs are queued
+# as rows are written and fetched over plain HTTP by a few worker threads, with a shared limit on requests
+# per second. Results are cached in output/enrichment.sqlite by listing (dedupe.listing_key of the URL),
+# so a listing fetched by any earlier run is never fetched again. Only definitive answers are cached: a
+# page an address was parsed from, or a 404/410 for a listing that is gone. Anything else (a 403, a bot
+# challenge or other page without an address, a 429 or 5xx, a network error) backs every worker off and
+# is retried a few times, then left uncached for the next run.
+#
+# Once a scrape ends, merge_addresses() adds a full_address column to its CSV from the cache. main.py does
+# this with --enrich, merging whatever was fetched while it scraped; this script enriches and merges an
+# existing scrape.
+#
+# Usage: python enrich.py [DD-MM-YYYY] [--concurrency 4] [--rate 2.0] [--limit N]
+import argparse
+import csv
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+import requests
+from fake_useragent import UserAgent
+import page_parser
+import snapshot
+from dedupe import listing_key
+from journal import journal_path
+
+ENRICHMENT_DB = "output/enrichment.sqlite"
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0
+REQUEST_TIMEOUT = 20
+MAX_ATTEMPTS = 3
+# Seconds every worker holds off after a response that was not a listing's page, unless it says how long
+# in Retry-After
+BACKOFF = 30.0
+# Statuses that mean the listing is gone for good, cached so it is not requested again
+GONE = (404, 410)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS details (key INTEGER PRIMARY KEY, url TEXT, address TEXT, status INTEGER, fetched REAL);
+"""
+
+
+class EnrichmentCache:
+    # Shared by the worker threads; every call is serialised by self.lock
+    def __init__(self, path=ENRICHMENT_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.RLock()
+
+    def has(self, key):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM details WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, url, address, status):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)", (key, url, address, status, time.time()))
+            self.db.commit()
+
+    def addresses(self, keys):
+        # {key: address} for the given keys that have one
+        keys = list(set(keys))
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                found.update(self.db.execute(
+                    f"SELECT key, address FROM details WHERE address IS NOT NULL AND key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall())
+        return found
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class RateLimiter:
+    # Spaces request starts at least 1/rate seconds apart across every worker, and holds them all off after a backoff
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            start = max(self.next_start, time.monotonic())
+            self.next_start = start + self.interval
+        time.sleep(max(start - time.monotonic(), 0.0))
+
+    def back_off(self, seconds):
+        with self.lock:
+            self.next_start = max(self.next_start, time.monotonic() + seconds)
+
+
+def retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", BACKOFF))
+    except ValueError:
+        return BACKOFF
+
+
+class Enricher:
+    # submit() only puts URLs on a queue, so the scraper never waits on a detail page
+    def __init__(self, cache, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+        self.cache = cache
+        self.limiter = RateLimiter(rate)
+        self.tasks = queue.Queue()
+        self.queued = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.local = threading.local()
+        self.user_agent = UserAgent(browsers=["chrome"]).chrome
+        self.found = 0
+        self.gone = 0
+        self.cached = 0
+        self.failed = 0
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(concurrency)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, urls):
+        for url in urls:
+            if not url:
+                continue
+            key = listing_key({'url': url})
+            with self.lock:
+                if key in self.queued:
+                    continue
+                self.queued.add(key)
+            self.tasks.put((key, url, 0))
+
+    def session(self):
+        # requests.Session is not thread-safe, so each worker keeps its own connection pool
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            self.local.session.headers['User-Agent'] = self.user_agent
+        return self.local.session
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None or self.stopping.is_set():
+                    return
+                self._fetch(*task)
+            finally:
+                self.tasks.task_done()
+
+    def _fetch(self, key, url, attempt):
+        if self.cache.has(key):
+            self.count('cached')
+            return
+        self.limiter.wait()
+        try:
+            response = self.session().get(url, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException:
+            response = None
+
+        address = page_parser.parse_detail_address(response.text) if response is not None and response.ok else None
+        if address is not None or (response is not None and response.status_code in GONE):
+            self.cache.put(key, url, address, response.status_code)
+            self.count('found' if address is not None else 'gone')
+            return
+
+        if response is not None:
+            self.limiter.back_off(retry_after(response))
+        if attempt + 1 < MAX_ATTEMPTS:
+            self.tasks.put((key, url, attempt + 1))
+        else:
+            self.count('failed')
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def wait(self):
+        # Blocks until every submitted URL has been fetched or given up on
+        self.tasks.join()
+
+    def stop(self):
+        # Drops URLs still queued (the next run fetches them) and waits for requests in flight
+        self.stopping.set()
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def summary(self):
+        return (f"{self.found} addresses fetched, {self.gone} listings gone, {self.cached} already cached, "
+                f"{self.failed} failed")
+
+
+def merge_addresses(csv_file, cache):
+    # Rewrites the CSV with a full_address column from the cache; returns how many rows have one
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        addresses = cache.addresses(listing_key(row) for row in csv.DictReader(f) if row.get('url'))
+
+    before = os.path.getsize(csv_file)
+    temporary = csv_file + ".enriching"
+    merged = 0
+    with open(csv_file, newline='', encoding='utf-8') as source, \
+            open(temporary, mode='w', newline='', encoding='utf-8') as target:
+        reader = csv.DictReader(source)
+        fieldnames = list(reader.fieldnames)
+        if 'full_address' not in fieldnames:
+            fieldnames.append('full_address')
+        writer = csv.DictWriter(target, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in reader:
+            # An address merged by an earlier run is kept if the cache has none
+            address = addresses.get(listing_key(row)) if row.get('url') else None
+            row['full_address'] = address or row.get('full_address') or None
+            merged += row['full_address'] is not None
+            writer.writerow(row)
+        target.flush()
+        os.fsync(target.fileno())
+    os.replace(temporary, csv_file)
+    update_journal(csv_file, before)
+    return merged
+
+
+def update_journal(csv_file, before):
+    # --resume cuts the CSV back to the length the journal last committed; a fully committed journal is moved
+    # to the rewritten length, so resuming appends after the merged rows instead of cutting through them
+    path = journal_path(csv_file)
+    if not os.path.exists(path):
+        return
+    db = sqlite3.connect(path, timeout=60)
+    try:
+        db.execute("UPDATE meta SET value = ? WHERE key = 'csv_size' AND value = ?",
+                   (str(os.path.getsize(csv_file)), str(before)))
+        db.commit()
+    finally:
+        db.close()
+
+
+def csv_urls(csv_file):
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        return [row['url'] for row in csv.DictReader(f) if row.get('url')]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Fetch full addresses from listing detail pages and merge them into a scrape.")
+    parser.add_argument('date', nargs='?', default=datetime.now().strftime("%d-%m-%Y"), help="Scrape date to enrich (DD-MM-YYYY).")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Detail pages fetched at once.")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Most detail requests started per second.")
+    parser.add_argument('--limit', type=int, default=None, help="Only fetch this many listings not already cached.")
+    args = parser.parse_args()
+
+    try:
+        datetime.strptime(args.date, '%d-%m-%Y')
+    except ValueError:
+        print("Date is not in the correct format. Expected DD-MM-YYYY.")
+        sys.exit(1)
+    if args.concurrency < 1 or args.rate <= 0:
+        print("--concurrency must be at least 1 and --rate above 0.")
+        sys.exit(1)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    csv_file = f"output/{args.date}.csv"
+    if not os.path.exists(csv_file):
+        print(f"Error: {csv_file} does not exist.")
+        sys.exit(1)
+
+    cache = EnrichmentCache()
+    urls = [url for url in dict.fromkeys(csv_urls(csv_file)) if not cache.has(listing_key({'url': url}))]
+    if args.limit is not None:
+        urls = urls[:args.limit]
+    print(f"Fetching {len(urls)} detail pages with {args.concurrency} workers at up to {args.rate:g} per second...")
+
+    enricher = Enricher(cache, args.concurrency, args.rate)
+    enricher.submit(urls)
+    try:
+        enricher.wait()
+    except KeyboardInterrupt:
+        print("Stopping; pages fetched so far are kept")
+    enricher.stop()
+    print("Enrichment:", enricher.summary())
+
+    merged = merge_addresses(csv_file, cache)
+    cache.close()
+    print(f"{merged} listings in {csv_file} have a full address")
+    print("Columnar snapshot has been stored in", snapshot.convert_csv(csv_file))
@@ -0,0 +1,264 @@
+# Local stand-in for Booking.com search results, for exercising the scraper without the live site
+#
+# Listings are generated deterministically per whole dollar, so any price bucket (nflt=price=AUD-<lo>-<hi>-1)
+# always returns the same properties. Pages mimic the parts of the real DOM the scraper relies on:
+# the aria-live result count, property cards, infinite scroll up to 75 cards, the "Load more results"
+# button, the sorters dropdown and the 1,000-result cap per ordering. Each card's photo and the page's web
+# font are served at realistic sizes, each listing has a detail page with its full address (for enrich.py), and /__stats reports the requests and bytes served by kind (page, cards,
+# image, font), so resource blocking (network.py) can be checked against what the server actually sent;
+# /__stats?reset=1 starts a new tally.
+#
+# Usage: python fixtures/server.py [--port 8765] [--scale 1.0]
+#        python main.py "http://localhost:8765/searchresults.html?ss=Australia"
+import argparse
+import html
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_PRICE = 5000
+RESULT_CAP = 1000
+INITIAL_CARDS = 25
+SCROLL_CARDS = 75
+BATCH_CARDS = 25
+
+# Roughly what a Booking.com card photo and a web font weigh
+PHOTO_BYTES = 30_000
+FONT_BYTES = 60_000
+
+PREFIXES = ["Harbour", "Beach", "City", "Garden", "Park", "Ocean", "Bay", "River", "Sunset", "Royal"]
+KINDS = ["Hotel", "Motel", "Apartments", "Resort", "Guest House", "Hostel", "Villa", "Cottage"]
+PLACES = ["Surry Hills, Sydney", "Bondi Beach, Sydney", "Fitzroy, Melbourne", "Southbank, Melbourne",
+          "Fortitude Valley, Brisbane", "Surfers Paradise, Gold Coast", "Fremantle, Perth", "Glenelg, Adelaide",
+          "Battery Point, Hobart", "Palm Cove, Cairns"]
+STREETS = ["George Street", "Beach Road", "Collins Street", "Queen Street", "Marine Parade", "Esplanade"]
+ROOMS = ["Double Room", "Queen Room", "Deluxe King Room", "Studio", "One-Bedroom Apartment", "Twin Room"]
+RATINGS = [(9, "Wonderful"), (8, "Very good"), (7, "Good"), (0, "Review score")]
+
+
+def listings_at(price, scale):
+    # Roughly log-normal around $180, so mid-range $10 buckets exceed the 1,000 cap at scale 1
+    density = math.exp(-((math.log(price) - math.log(180)) ** 2) / (2 * 0.5 ** 2)) * 130 * scale
+    return int(density)
+
+
+def make_listing(price, k):
+    rng = random.Random(price * 100_003 + k)
+    listing_id = price * 1000 + k
+    new = rng.random() < 0.08
+    score = round(rng.uniform(5.5, 9.9), 1)
+    return {
+        "id": listing_id,
+        "title": f"{rng.choice(PREFIXES)} {rng.choice(KINDS)} {listing_id}",
+        "address": rng.choice(PLACES),
+        "cost": price,
+        "review_score": None if new else score,
+        "number_of_reviews": None if new else rng.randint(1, 4000),
+        "room_type": rng.choice(ROOMS),
+        "popularity": rng.random(),
+    }
+
+
+def bucket_listings(lower, upper, scale):
+    return [make_listing(price, k) for price in range(lower, upper + 1) for k in range(listings_at(price, scale))]
+
+
+def parse_bucket(query):
+    # nflt=price=AUD-<lower>-<upper>-1, where either bound may be "min" / "max"
+    for value in query.get("nflt", []):
+        if value.startswith("price=AUD-"):
+            lower, upper = value[len("price=AUD-"):].split("-")[:2]
+            return (1 if lower == "min" else int(lower)), (MAX_PRICE if upper == "max" else int(upper))
+    return 1, MAX_PRICE
+
+
+def render_card(listing, base_url):
+    review = ""
+    if listing["review_score"] is not None:
+        score = listing["review_score"]
+        label = next(text for floor, text in RATINGS if score >= floor)
+        review = (f'<div data-testid="review-score"><div>Scored {score}</div><div>{score}</div>'
+                  f'<div>{label}</div><div>{listing["number_of_reviews"]:,} reviews</div></div>')
+    url = f'{base_url}/hotel/au/fixture-{listing["id"]}.html'
+    return (
+        '<div data-testid="property-card">'
+        f'<a href="{url}" target="_blank" rel="noopener noreferrer"><img src="/static/photo-{listing["id"]}.jpg" width="200" height="200"></a>'
+        f'<div data-testid="title">{html.escape(listing["title"])}</div>'
+        f'<span data-testid="address">{html.escape(listing["address"])}</span>'
+        f'<div data-testid="recommended-units"><div>{listing["room_type"]}</div><div>1 bed</div></div>'
+        f'{review}'
+        f'<div data-testid="price-and-discounted-price">AUD {listing["cost"]:,}</div>'
+        '</div>'
+    )
+
+
+def full_address(listing):
+    # What the listing's detail page shows in its header
+    rng = random.Random(listing["id"])
+    suburb, city = listing["address"].split(", ")
+    return f'{rng.randint(1, 400)} {rng.choice(STREETS)}, {suburb}, {city}, Australia'
+
+
+DETAIL_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h2>{title}</h2>
+<div data-testid="PropertyHeaderAddressDesktop-wrapper"><span>{address}</span><div>Excellent location - show map</div></div>
+</body></html>"""
+
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Fixture search results</title>
+<style>@font-face {{ font-family: "Fixture Sans"; src: url("/static/fixture-sans.woff2") format("woff2"); }}
+body {{ font-family: "Fixture Sans", sans-serif; }}
+[data-testid="property-card"] {{ height: 220px; border-bottom: 1px solid #ccc; }}
+#sorters {{ display: none; }} #sorters.open {{ display: block; }}</style></head>
+<body>
+<div aria-live="assertive">{place}: {total:,} properties found</div>
+<button data-testid="sorters-dropdown-trigger" onclick="document.getElementById('sorters').classList.toggle('open')">Sort by</button>
+<div id="sorters">
+  <button data-id="popularity" onclick="sortBy('popularity')">Our top picks</button>
+  <button data-id="price" onclick="sortBy('price')">Price (lowest first)</button>
+  <button data-id="price_from_high_to_low" onclick="sortBy('price_from_high_to_low')">Price (highest first)</button>
+</div>
+<div id="results">{cards}</div>
+<button id="load-more" style="display: none" onclick="loadMore()"><span>Load more results</span></button>
+<script>
+  var query = {query}, order = "popularity", loaded = {loaded}, available = {available}, busy = false;
+  function fetchCards(count, reset) {{
+    busy = true;
+    fetch("/cards?" + query + "&order=" + order + "&offset=" + (reset ? 0 : loaded) + "&limit=" + count)
+      .then(function (r) {{ return r.text(); }})
+      .then(function (markup) {{
+        var results = document.getElementById("results");
+        if (reset) {{ results.innerHTML = ""; loaded = 0; }}
+        results.insertAdjacentHTML("beforeend", markup);
+        loaded = Math.min(loaded + count, available);
+        busy = false;
+        refreshButton();
+      }});
+  }}
+  function refreshButton() {{
+    document.getElementById("load-more").style.display = (loaded >= {scroll_cards} && loaded < available) ? "block" : "none";
+  }}
+  function loadMore() {{ if (!busy) fetchCards({batch_cards}, false); }}
+  function sortBy(value) {{ order = value; document.getElementById("sorters").classList.remove("open"); fetchCards({initial_cards}, true); }}
+  window.addEventListener("scroll", function () {{
+    var nearBottom = window.innerHeight + window.scrollY >= document.body.scrollHeight - 400;
+    if (nearBottom && !busy && loaded < {scroll_cards} && loaded < available) fetchCards({batch_cards}, false);
+  }});
+  refreshButton();
+</script>
+</body></html>"""
+
+
+class ServedStats:
+    # Requests and bytes served by kind, shared by every handler thread
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.bytes = Counter()
+
+    def add(self, kind, nbytes):
+        with self.lock:
+            self.requests[kind] += 1
+            self.bytes[kind] += nbytes
+
+    def snapshot(self, reset=False):
+        with self.lock:
+            stats = {"requests": dict(self.requests), "bytes": dict(self.bytes)}
+            if reset:
+                self.requests.clear()
+                self.bytes.clear()
+            return stats
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    scale = 1.0
+    stats = ServedStats()
+    # Seconds each detail page takes to answer, as a real site's would
+    detail_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type="text/html; charset=utf-8", status=200, kind=None):
+        payload = body.encode("utf-8") if isinstance(body, str) else body
+        if kind:
+            self.stats.add(kind, len(payload))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def ordered(self, query):
+        lower, upper = parse_bucket(query)
+        listings = bucket_listings(lower, upper, self.scale)
+        order = query.get("order", ["popularity"])[0]
+        if order == "price":
+            listings.sort(key=lambda listing: (listing["cost"], listing["id"]))
+        elif order == "price_from_high_to_low":
+            listings.sort(key=lambda listing: (-listing["cost"], listing["id"]))
+        else:
+            listings.sort(key=lambda listing: listing["popularity"])
+        return listings
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        base_url = f"http://{self.headers.get('Host')}"
+
+        if parsed.path.startswith("/searchresults"):
+            listings = self.ordered(query)
+            available = min(len(listings), RESULT_CAP)
+            # ?initial=N pre-renders more cards, for benchmarks that need a long page without scrolling
+            initial = int(query.get("initial", [str(INITIAL_CARDS)])[0])
+            cards = "".join(render_card(listing, base_url) for listing in listings[:initial])
+            page = PAGE.format(place=html.escape(query.get("ss", ["Australia"])[0]), total=len(listings), cards=cards,
+                               query=json.dumps(parsed.query), loaded=min(initial, available), available=available,
+                               scroll_cards=SCROLL_CARDS, batch_cards=BATCH_CARDS, initial_cards=INITIAL_CARDS)
+            self.send_body(page, kind="page")
+        elif parsed.path == "/cards":
+            listings = self.ordered(query)[:RESULT_CAP]
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", [str(BATCH_CARDS)])[0])
+            self.send_body("".join(render_card(listing, base_url) for listing in listings[offset:offset + limit]), kind="cards")
+        elif parsed.path.startswith("/static/") and parsed.path.endswith(".jpg"):
+            self.send_body(bytes(PHOTO_BYTES), content_type="image/jpeg", kind="image")
+        elif parsed.path.startswith("/static/") and parsed.path.endswith(".woff2"):
+            self.send_body(bytes(FONT_BYTES), content_type="font/woff2", kind="font")
+        elif parsed.path.startswith("/hotel/au/fixture-"):
+            listing_id = int(parsed.path[len("/hotel/au/fixture-"):].split(".")[0])
+            listing = make_listing(listing_id // 1000, listing_id % 1000)
+            time.sleep(self.detail_delay)
+            self.send_body(DETAIL_PAGE.format(title=html.escape(listing["title"]), address=html.escape(full_address(listing))),
+                           kind="detail")
+        elif parsed.path == "/__stats":
+            reset = query.get("reset", ["0"])[0] == "1"
+            self.send_body(json.dumps(self.stats.snapshot(reset)), content_type="application/json")
+        else:
+            self.send_body("Not found", status=404)
+
+
+def start_server(port=0, scale=1.0, detail_delay=0.0):
+    # Starts the fixture server on a background thread and returns (server, base_url)
+    handler = type("ScaledFixtureHandler", (FixtureHandler,), {"scale": scale, "stats": ServedStats(), "detail_delay": detail_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve canned Booking.com-style search result pages.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier on the number of listings per price.")
+    args = parser.parse_args()
+    handler = type("ScaledFixtureHandler", (FixtureHandler,), {"scale": args.scale})
+    print(f"Serving fixture search results on http://127.0.0.1:{args.port}/searchresults.html?ss=Australia")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
@@ -0,0 +1,155 @@
+# Crash-safe progress journal for main.py, so an interrupted scrape can be picked up with --resume
+#
+# output/<DD-MM-YYYY>.journal is a SQLite database in WAL mode. It holds the search being scraped, the
+# buckets that are finished (or already known to be over the cap), the card offset reached in each sort
+# pass of the bucket in progress, the dedupe key (see dedupe.py) of every row in the CSV, and the length
+# of the CSV at the last commit. Resuming truncates the CSV back to that length, so the CSV and the journal always
+# agree: rows written after the last commit are dropped and scraped again.
+#
+# Commits are batched (every COMMIT_ROWS keys or COMMIT_INTERVAL seconds, and at bucket boundaries).
+# Each one fsyncs the CSV first so the recorded length is never ahead of what is on disk; the journal
+# itself runs with synchronous=NORMAL, so losing its last commits only means re-scraping a little more.
+import csv
+import os
+import sqlite3
+import threading
+import time
+
+COMMIT_ROWS = 500
+COMMIT_INTERVAL = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, count INTEGER, done INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS offsets (bucket TEXT, pass TEXT, offset INTEGER, PRIMARY KEY (bucket, pass));
+CREATE TABLE IF NOT EXISTS seen (key INTEGER PRIMARY KEY);
+"""
+
+
+def journal_path(csv_file):
+    return os.path.splitext(csv_file)[0] + ".journal"
+
+
+class ScrapeJournal:
+    def __init__(self, csv_file, search_url, resume=False, commit_rows=COMMIT_ROWS, commit_interval=COMMIT_INTERVAL):
+        self.csv_file = csv_file
+        self.path = journal_path(csv_file)
+        self.resuming = resume
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval
+
+        if resume and not os.path.exists(self.path):
+            raise ValueError(f"There is no journal to resume from at {self.path}")
+        if not resume:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+        # Shared by pool workers; every call is serialised by self.lock
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.RLock()
+
+        stored_url = self.meta("search_url")
+        if resume and stored_url != search_url:
+            self.db.close()
+            raise ValueError(f"{self.path} was written for a different search: {stored_url}")
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('search_url', ?)", (search_url,))
+        self.db.commit()
+
+        self.writer = None
+        self.pending = 0
+        self.last_commit = time.monotonic()
+
+    def meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def prepare_csv(self, fieldnames):
+        # Starts a new CSV, or cuts a resumed one back to the last committed length. Returns the columns to
+        # append under: a resumed CSV keeps its own header, which enrich.py may have widened with full_address
+        with self.lock:
+            if self.resuming:
+                if not os.path.exists(self.csv_file):
+                    raise ValueError(f"Cannot resume: {self.csv_file} is missing")
+                with open(self.csv_file, mode='r+b') as f:
+                    f.truncate(int(self.meta("csv_size")))
+                with open(self.csv_file, newline='', encoding='utf-8') as f:
+                    fieldnames = next(csv.reader(f), None) or fieldnames
+            else:
+                with open(self.csv_file, mode='w', newline='', encoding='utf-8') as f:
+                    csv.DictWriter(f, fieldnames=fieldnames).writeheader()
+            self.commit()
+            return list(fieldnames)
+
+    def attach_writer(self, writer):
+        # Once the CSV is written through a BufferedCsvWriter, commits sync through it so buffered rows count
+        with self.lock:
+            self.writer = writer
+
+    def seen_keys(self):
+        with self.lock:
+            return [key for (key,) in self.db.execute("SELECT key FROM seen")]
+
+    def bucket(self, name):
+        # Returns (count, done) for a bucket the journal has seen, otherwise None
+        with self.lock:
+            row = self.db.execute("SELECT count, done FROM buckets WHERE name = ?", (name,)).fetchone()
+            return (row[0], bool(row[1])) if row else None
+
+    def record_count(self, name, count):
+        with self.lock:
+            self.db.execute("INSERT INTO buckets (name, count) VALUES (?, ?) "
+                            "ON CONFLICT (name) DO UPDATE SET count = excluded.count", (name, count))
+            self.pending += 1
+
+    def finish_bucket(self, name, count=None):
+        # Bucket boundaries are always committed, so a resumed run never re-opens a finished bucket
+        with self.lock:
+            self.db.execute("INSERT INTO buckets (name, count, done) VALUES (?, ?, 1) "
+                            "ON CONFLICT (name) DO UPDATE SET count = coalesce(excluded.count, count), done = 1",
+                            (name, count))
+            self.db.execute("DELETE FROM offsets WHERE bucket = ?", (name,))
+            self.commit()
+
+    def offset(self, bucket, pass_name):
+        with self.lock:
+            row = self.db.execute("SELECT offset FROM offsets WHERE bucket = ? AND pass = ?",
+                                  (bucket, pass_name)).fetchone()
+            return row[0] if row else 0
+
+    def set_offset(self, bucket, pass_name, offset):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO offsets VALUES (?, ?, ?)", (bucket, pass_name, offset))
+            self.pending += 1
+
+    def add_keys(self, keys):
+        # Keys of rows that are already in the CSV
+        with self.lock:
+            cursor = self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in keys))
+            self.pending += max(cursor.rowcount, 0)
+
+    def maybe_commit(self):
+        with self.lock:
+            if self.pending >= self.commit_rows or time.monotonic() - self.last_commit >= self.commit_interval:
+                self.commit()
+
+    def commit(self):
+        with self.lock:
+            if self.writer:
+                csv_size = self.writer.sync()
+            else:
+                with open(self.csv_file, mode='rb') as f:
+                    os.fsync(f.fileno())
+                    csv_size = os.fstat(f.fileno()).st_size
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('csv_size', ?)", (str(csv_size),))
+            self.db.commit()
+            self.pending = 0
+            self.last_commit = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.db.close()
@@ -0,0 +1,134 @@
+# Per-location aggregates for /location_analysis and /property_percentile
+# (expects the typed frame from schema.apply_schema)
+#
+# Addresses are normalised into location keys: the whole address plus each comma-separated part, so
+# "Surry Hills, Sydney" is filed under "surry hills, sydney", "surry hills" (the locality) and "sydney"
+# (the region). Each key keeps its listings' costs sorted, plus stats computed once at load.
+#
+# A lookup matches every address containing the location, as the DataFrame filter it replaced did, but
+# over the distinct addresses rather than the rows. When those addresses are exactly a key's (the usual
+# case for a locality or region), the key's stats answer it and a percentile rank is two binary searches;
+# otherwise, as for "sydney" when some address reads "North Sydney" with no region, the matching rows are
+# aggregated on the spot.
+import numpy as np
+import pandas as pd
+from schema import to_float64
+
+
+def location_keys(address):
+    address = address.strip().lower()
+    parts = [part.strip() for part in address.split(',')]
+    return {key for key in [address] + parts if key}
+
+
+class LocationSummary:
+    # Stats follow /location_analysis: missing costs and review scores count as 0.
+    # Percentiles only rank against listings that have a cost. rows_scanned is how many listings were
+    # read to build the summary (none when it comes from the precomputed stats).
+    def __init__(self, count, average_price, median_price, price_variance, min_price, max_price,
+                 average_review_score, sorted_cost, rows_scanned=0):
+        self.count = count
+        self.average_price = average_price
+        self.median_price = median_price
+        self.price_variance = price_variance
+        self.min_price = min_price
+        self.max_price = max_price
+        self.average_review_score = average_review_score
+        self.sorted_cost = sorted_cost
+        self.rows_scanned = rows_scanned
+
+    @classmethod
+    def from_rows(cls, cost, review, rows):
+        filled = pd.Series(np.nan_to_num(cost[rows], nan=0.0))
+        valid = cost[rows]
+        return cls(len(rows), filled.mean(), filled.median(), filled.var(), filled.min(), filled.max(),
+                   np.nan_to_num(review[rows], nan=0.0).mean(), np.sort(valid[~np.isnan(valid)]), len(rows))
+
+    def percentile(self, value):
+        # Same as scipy.stats.percentileofscore(kind='rank'), in O(log n)
+        n = len(self.sorted_cost)
+        if n == 0:
+            return float('nan')
+        left = np.searchsorted(self.sorted_cost, value, side='left')
+        right = np.searchsorted(self.sorted_cost, value, side='right')
+        return float((left + right + (right > left)) * 50.0 / n)
+
+
+class LocationIndex:
+    def __init__(self, df):
+        size = len(df)
+        # Aggregated in float64 from the values as scraped; the frame's float32 columns would shift means
+        # and variances enough to change how they round
+        self.cost = to_float64(df['cost']) if 'cost' in df.columns else np.full(size, np.nan)
+        if 'review_score' in df.columns:
+            self.review = to_float64(df['review_score'])
+        else:
+            self.review = np.full(size, np.nan)
+
+        # Distinct addresses, lower-cased, and the address code of every row
+        codes, values = pd.factorize(df['address'].astype(object).fillna('').astype(str) if 'address' in df.columns
+                                     else pd.Series([''] * size))
+        lowered, values = pd.factorize(pd.Series(values).str.strip().str.lower())
+        self.codes, self.values = lowered[codes].astype(np.int32), np.asarray(values, dtype=object)
+
+        # Location keys of each distinct address, as CSR arrays: key_ids[key_starts[code]:key_starts[code + 1]]
+        keys, key_ids, key_counts = {}, [], []
+        for address in self.values:
+            address_keys = location_keys(address)
+            key_ids.extend(keys.setdefault(key, len(keys)) for key in address_keys)
+            key_counts.append(len(address_keys))
+        self.keys = keys
+        key_ids = np.array(key_ids, dtype=np.int16 if len(keys) < 2 ** 15 else np.int32)
+        # How many distinct addresses each key is filed under
+        self.key_addresses = np.bincount(key_ids, minlength=len(keys)).astype(np.int64)
+        key_starts = np.zeros(len(key_counts) + 1, dtype=np.int64)
+        key_starts[1:] = np.cumsum(key_counts)
+
+        # Rows are taken in cost order and fanned out to one (key, row) pair per key of their address; a
+        # stable sort by key then leaves each key's rows in cost order (radix sort while keys fit in int16)
+        row_ids = np.argsort(self.cost, kind='stable')
+        row_codes = self.codes[row_ids]
+        fan_out = np.diff(key_starts)[row_codes]
+        row_ids = np.repeat(row_ids, fan_out)
+        ends = np.cumsum(fan_out)
+        positions = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - fan_out - key_starts[row_codes], fan_out)
+        key_ids = key_ids[positions]
+        order = np.argsort(key_ids, kind='stable')
+        key_ids, row_ids = key_ids[order], row_ids[order]
+        pair_cost = self.cost[row_ids]
+
+        # NaN costs sort last within each key, so a key's valid costs are the front of its slice
+        self.offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(key_ids, minlength=len(keys)))
+        self.valid = np.bincount(key_ids, weights=~np.isnan(pair_cost), minlength=len(keys)).astype(np.int64)
+        self.sorted_cost = pair_cost
+
+        grouped = pd.DataFrame({
+            'key': key_ids,
+            'cost': np.nan_to_num(pair_cost, nan=0.0),
+            'review': np.nan_to_num(self.review[row_ids], nan=0.0),
+        }).groupby('key')
+        self.stats = grouped['cost'].agg(['count', 'mean', 'median', 'var', 'min', 'max']).join(
+            grouped['review'].mean().rename('review')).reindex(range(len(keys)))
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.offsets.nbytes + self.valid.nbytes + self.sorted_cost.nbytes + \
+            self.key_addresses.nbytes + self.cost.nbytes + self.review.nbytes + int(self.stats.memory_usage().sum())
+
+    def lookup(self, location):
+        # Returns a LocationSummary for every address containing `location`; None if nothing matches
+        location = location.lower()
+        matches = np.flatnonzero(pd.Series(self.values, dtype=object).str.contains(location, regex=False).to_numpy())
+        if len(matches) == 0:
+            return None
+
+        # A key is part of every address filed under it, so those addresses are always among the matches;
+        # when they are all of them, the key's stats are the answer
+        key = self.keys.get(location)
+        if key is not None and self.key_addresses[key] == len(matches):
+            start = self.offsets[key]
+            stats = self.stats.iloc[key]
+            return LocationSummary(int(stats['count']), stats['mean'], stats['median'], stats['var'], stats['min'],
+                                   stats['max'], stats['review'], self.sorted_cost[start:start + self.valid[key]])
+        return LocationSummary.from_rows(self.cost, self.review, np.flatnonzero(np.isin(self.codes, matches)))
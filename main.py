@@ -1,27 +1,104 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from selenium.webdriver.common.action_chains import ActionChains
 from fake_useragent import UserAgent
 import undetected_chromedriver as uc
+import argparse
+import gzip
+import os
 import time
+import uuid
 import random
 import csv
 import json
 import sys
 import requests
 from datetime import datetime
+import snapshot
+import page_parser
+from csv_writer import BufferedCsvWriter
+from dedupe import BLOOM_ERROR_RATE, KeySet, listing_key, make_store
+from planner import PricePlanner, bucket_label, plan_path, price_bounds
+from journal import ScrapeJournal
+from run_report import BucketStats, RunReport
+from changes import ChangeIndex
+from enrich import DEFAULT_CONCURRENCY, DEFAULT_RATE, EnrichmentCache, Enricher, merge_addresses
+from network import BlockPolicy, NetworkMonitor, DEFAULT_RESOURCE_TYPES, DEFAULT_URL_PATTERNS, RESOURCE_PATTERNS
+from waits import CARD_SELECTOR, NEW_CARD_SELECTOR, Waiter, WaitPolicy
+
+# Attempts at reading page state before a bucket is given up on (so a dead driver cannot spin forever)
+MAX_ATTEMPTS = 10
+
+# Pulls the raw text of every field from a batch of property cards in one round-trip.
+# innerText is what WebElement.text reports, before Selenium's whitespace clean-up (see page_parser.normalise_text).
+EXTRACT_CARDS_SCRIPT = """
+var text = function (card, selector) {
+    var element = card.querySelector(selector);
+    return element ? element.innerText : null;
+};
+return arguments[0].map(function (card) {
+    var link = card.querySelector("a[target='_blank'][rel='noopener noreferrer']");
+    return {
+        title: text(card, "[data-testid='title']"),
+        cost: text(card, "[data-testid='price-and-discounted-price']"),
+        review: text(card, "[data-testid='review-score']"),
+        room_type: text(card, "[data-testid='recommended-units']"),
+        address: text(card, "[data-testid='address']"),
+        url: link ? link.href : null
+    };
+});
+"""
+
+# Tags processed cards so later batches skip them, or removes them (arguments[1]) to keep the DOM small
+FINISH_CARDS_SCRIPT = """
+var drop = arguments[1];
+arguments[0].forEach(function (card) {
+    if (drop) {
+        card.remove();
+    } else {
+        card.setAttribute("data-scraped", "");
+    }
+});
+"""
+
+# A re-sorted list may reuse card nodes, so every pass starts with no card tagged
+CLEAR_TAGS_SCRIPT = """
+document.querySelectorAll("[data-scraped]").forEach(function (card) { card.removeAttribute("data-scraped"); });
+"""
 
 class BookingScraper:
-    def __init__(self, csv_file):
-        self.driver = self._init_driver(self.get_proxy())
+    def __init__(self, csv_file, driver=None, listings=None, wait_policy=None, journal=None, report=None, block_policy=None):
+        self.driver = driver if driver is not None else self._init_driver(self.get_proxy())
+        self.waiter = Waiter(self.driver, wait_policy)
+        # Blocks the resources in block_policy (none when it is None) and tallies traffic for the run report
+        self.network = NetworkMonitor(self.driver, block_policy)
+        # Stage timings and counters of the current bucket, written to the run report when it ends
+        self.report = report
+        self.stats = BucketStats(None, self.waiter)
         self.csv_file = csv_file
-        self.fieldnames = ["title", "address", "cost", "review_score", "number_of_reviews", "room_type", "url"]
+        self.fieldnames = list(page_parser.FIELDNAMES)
+        self.journal = journal
         self._init_csv()
-        self.listings = set()
+        self.listings = listings if listings is not None else KeySet()
+        if journal:
+            self.listings.update(journal.seen_keys())
+
+        # Where the journal records card offsets: the current bucket and its sort pass
+        self.bucket_label = None
+        self.sort_pass = "default"
+        self.batched_extraction = True
+
+        # Every scrolled results page is archived so it can be re-parsed offline (see replay.py)
+        self.archive_dir = os.path.splitext(csv_file)[0] + ".pages"
+        self.archive_pages = True
+
+        # Written cards are removed from the page instead of tagged, so the DOM stays small on long buckets
+        self.drop_cards = False
+
+        # With --enrich, detail URLs of written rows are queued for enrich.py's background fetchers
+        self.enricher = None
     
     def _init_driver(self, proxy):
         print("Initialising driver...")
@@ -44,16 +121,26 @@ class BookingScraper:
         return driver
     
     def get_proxy(self):
-        response = requests.get('https://api.proxyscrape.com/v4/free-proxy-list/get?request=display_proxies&proxy_format=protocolipport&format=text')
+        try:
+            response = requests.get('https://api.proxyscrape.com/v4/free-proxy-list/get?request=display_proxies&proxy_format=protocolipport&format=text', timeout=30)
+        except requests.RequestException as e:
+            print("Could not fetch proxy list:", e)
+            return None
         proxies = response.text.splitlines()
         cleaned_proxies = [proxy.split('://')[-1] for proxy in proxies]
         random.shuffle(cleaned_proxies)
-        return cleaned_proxies[0]
+        return cleaned_proxies[0] if cleaned_proxies else None
 
     def _init_csv(self):
-        with open(self.csv_file, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            writer.writeheader()
+        if self.journal:
+            self.fieldnames = self.journal.prepare_csv(self.fieldnames)
+        else:
+            with open(self.csv_file, mode='w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+                writer.writeheader()
+        self.writer = BufferedCsvWriter(self.csv_file, self.fieldnames)
+        if self.journal:
+            self.journal.attach_writer(self.writer)
 
     def handle_no_such_element_exception(self, data_extraction_task):
         try:
@@ -63,262 +150,401 @@ class BookingScraper:
 
     def handle_get_review_score(self, data_extraction_task):
         try:
-            text = data_extraction_task()
-            lines = text.splitlines()
-            return lines[1] if len(lines) > 1 else "New to Booking.com"
+            return self.parse_review_score(data_extraction_task())
         except NoSuchElementException:
             return "New to Booking.com"
 
     def handle_get_review_count(self, data_extraction_task):
         try:
-            text = data_extraction_task()
-            lines = text.splitlines()
-            if len(lines) > 3:
-                parts = lines[3].split()
-                if parts:
-                    return parts[0]
-            return 0
+            return self.parse_review_count(data_extraction_task())
         except NoSuchElementException:
             return 0
 
-    def get_address(self, url):
-        self.driver.execute_script("window.open(arguments[0], '_blank');", url)
-        self.driver.switch_to.window(self.driver.window_handles[-1])
-       
-        time.sleep(random.uniform(3, 5))
-
-        try:
-            element = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[data-testid='PropertyHeaderAddressDesktop-wrapper']"))
-            )
-            address_text = element.text
-        except TimeoutException:
-            address_text = None
-
-        address = address_text.splitlines()[0] if address_text else None
-
-        self.driver.close()
-        
-        self.driver.switch_to.window(self.driver.window_handles[0])
-        
-        time.sleep(random.uniform(3, 5))
-        
-        return address
+    def parse_review_score(self, text):
+        return page_parser.parse_review_score(text)
+
+    def parse_review_count(self, text):
+        return page_parser.parse_review_count(text)
+
+    def extract_card(self, x):
+        # Reads one property card with a WebDriver round-trip per field
+        title = self.handle_no_such_element_exception(
+            lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='title']").text
+        )
+        cost_text = self.handle_no_such_element_exception(
+            lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='price-and-discounted-price']").text
+        )
+        cost = cost_text.split()[1] if cost_text else None
+
+        # Score and count come from the same element, so it is only fetched once
+        review_text = self.handle_no_such_element_exception(
+            lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='review-score']").text
+        )
+        review_score = self.parse_review_score(review_text)
+        number_of_reviews = self.parse_review_count(review_text)
+
+        room_type_text = self.handle_no_such_element_exception(
+            lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='recommended-units']").text
+        )
+        room_type = room_type_text.splitlines()[0] if room_type_text else None
+
+        # The card shows the suburb and city; enrich.py adds the full address from the detail page
+        address = self.handle_no_such_element_exception(lambda: x.find_element(By.CSS_SELECTOR, "[data-testid=\"address\"]").text)
+
+        url = x.find_element(
+            By.CSS_SELECTOR, "a[target='_blank'][rel='noopener noreferrer']"
+        ).get_attribute("href")
+
+        return {
+            "title": title,
+            "address": address,
+            "cost": cost,
+            "review_score": review_score,
+            "number_of_reviews": number_of_reviews,
+            "room_type": room_type,
+            "url": url
+        }
+
+    def extract_cards(self, items):
+        # Reads every field of every card in a single execute_script round-trip, then parses the
+        # raw text with the same rules as extract_card
+        raw_cards = self.driver.execute_script(EXTRACT_CARDS_SCRIPT, items)
+        rows = []
+        for raw in raw_cards:
+            raw = {field: page_parser.normalise_text(value) if field != "url" else value for field, value in raw.items()}
+            rows.append(page_parser.row_from_fields(raw))
+        return rows
 
     def scrape(self, items):
+        rows = None
+        if self.batched_extraction:
+            try:
+                rows = self.extract_cards(items)
+            except WebDriverException as e:
+                print("Batched extraction failed, reading cards one field at a time:", e)
+                self.stats.count('extract_fallbacks')
+        if rows is None:
+            rows = [self.extract_card(x) for x in items]
+
         results = []
-        for x in items:
-            title = self.handle_no_such_element_exception(
-                lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='title']").text
-            )
-            cost_text = self.handle_no_such_element_exception(
-                lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='price-and-discounted-price']").text
-            )
-            cost = cost_text.split()[1] if cost_text else None
-
-            review_score = self.handle_get_review_score(
-                lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='review-score']").text
-            )
-            number_of_reviews = self.handle_get_review_count(
-                lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='review-score']").text
-            )
-            room_type_text = self.handle_no_such_element_exception(
-                lambda: x.find_element(By.CSS_SELECTOR, "[data-testid='recommended-units']").text
-            )
-            room_type = room_type_text.splitlines()[0] if room_type_text else None
-
-            # Get detail page URL for address
-            # detail_link = x.find_element(
-            #     By.CSS_SELECTOR, "a[target='_blank'][rel='noopener noreferrer']"
-            # ).get_attribute("href")
-
-            address = self.handle_no_such_element_exception(lambda: x.find_element(By.CSS_SELECTOR, "[data-testid=\"address\"]").text)
-
-            url = x.find_element(
-                By.CSS_SELECTOR, "a[target='_blank'][rel='noopener noreferrer']"
-            ).get_attribute("href")
-
-            # try:
-            #     url = self.get_address(test)
-            # except:
-            #     url = test
-
-            item = {
-                "title": title,
-                "address": address,
-                "cost": cost,
-                "review_score": review_score,
-                "number_of_reviews": number_of_reviews,
-                "room_type": room_type,
-                "url": url
-            }
-
-            hashable_item = frozenset(item.items())
-            if hashable_item not in self.listings:
+        for item in rows:
+            hashable_item = listing_key(item)
+            if self.is_new(hashable_item):
                 results.append(item)
-                self.listings.add(hashable_item)
 
         return results
 
+    def is_new(self, hashable_item):
+        return self.listings.add(hashable_item)
+
     def append_to_csv(self, data):
-        with open(self.csv_file, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
-            for row in data:
-                writer.writerow(row)
+        self.writer.write(data)
+        if self.journal:
+            self.journal.add_keys(listing_key(row) for row in data)
+
+    def resume_offset(self):
+        # Cards before this offset in the current pass were written before the last interruption. Only the
+        # price-sorted passes list cards in the same order every session; the default (popularity) order
+        # shifts between sessions, so that pass rescans from the top and the journal's keys skip duplicates
+        if self.journal and self.bucket_label and self.sort_pass in ("price", "price_from_high_to_low"):
+            return self.journal.offset(self.bucket_label, self.sort_pass)
+        return 0
+
+    def record_progress(self, offset):
+        if self.journal and self.bucket_label:
+            self.journal.set_offset(self.bucket_label, self.sort_pass, offset)
+            self.journal.maybe_commit()
+
+    def archive_page(self):
+        # Stores the current page_source gzipped, with its URL on the first line
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive_file = os.path.join(self.archive_dir, f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.html.gz")
+        with gzip.open(archive_file, "wt", encoding="utf-8") as f:
+            f.write(f"<!-- url: {self.driver.current_url} -->\n")
+            f.write(self.driver.page_source)
 
     def scroll_page(self, total_number):
+        try:
+            self._scroll_page(total_number)
+        finally:
+            # Archived once per pass, when the DOM holds every card loaded so far (even if the pass failed).
+            # Dropped cards are gone by then, so finish_cards archives each batch before dropping it instead.
+            if self.archive_pages and not self.drop_cards:
+                try:
+                    with self.stats.stage('archive'):
+                        self.archive_page()
+                except Exception as e:
+                    print("Could not archive page:", e)
+
+    def _scroll_page(self, total_number):
 
         this_count = 0
+        # Cards already in the CSV are still scrolled past, but not read again
+        skip_to = self.resume_offset()
+        self.driver.execute_script(CLEAR_TAGS_SCRIPT)
         
         while this_count < total_number:
-            while True:
-                try:
-                    last_height = self.driver.execute_script("return document.body.scrollHeight") 
-                    break
-                except:
-                    time.sleep(random.uniform(3, 5))
-
-            while True:
-                if total_number > 20:
-                    self.driver.execute_script("window.scrollBy(0, document.body.scrollHeight);")
-                    time.sleep(random.uniform(3, 5))
-                    new_height = self.driver.execute_script("return document.body.scrollHeight")
-                    if new_height == last_height:
+            with self.stats.stage('scroll'):
+                for attempt in range(MAX_ATTEMPTS):
+                    try:
+                        last_height = self.driver.execute_script("return document.body.scrollHeight") 
+                        break
+                    except Exception:
+                        if attempt == MAX_ATTEMPTS - 1:
+                            raise
+                        self.stats.count('page_read_retries')
+                        self.waiter.pause()
+
+                while True:
+                    if total_number > 20:
+                        # Returns as soon as the scroll loads more cards, or once the page has stopped growing
+                        self.driver.execute_script("window.scrollBy(0, document.body.scrollHeight);")
+                        new_height = self.waiter.for_height_change(last_height)
+                        if new_height == last_height:
+                            break
+                        last_height = new_height
+                    else:
                         break
-                    last_height = new_height
-                else:
-                    break
 
-            property_items = self.driver.find_elements(By.CSS_SELECTOR, "[data-testid='property-card']")
-            new_property_items = property_items[this_count:]
-            recent_scrape = self.scrape(new_property_items)
-            self.append_to_csv(recent_scrape)
-            print(f"Just scraped {len(recent_scrape)} new items.")
-            this_count = len(property_items)
+                # Only cards not processed yet are fetched, so a batch costs the same however long the page grows
+                property_items = self.driver.find_elements(By.CSS_SELECTOR, NEW_CARD_SELECTOR)
+            new_property_items = property_items[max(skip_to - this_count, 0):]
+            with self.stats.stage('extract'):
+                recent_scrape = self.scrape(new_property_items)
+            self.stats.count('cards', len(new_property_items))
+            self.stats.count('rows', len(recent_scrape))
+            with self.stats.stage('write'):
+                self.append_to_csv(recent_scrape)
+                if self.enricher:
+                    self.enricher.submit(row['url'] for row in recent_scrape)
+                print(f"Just scraped {len(recent_scrape)} new items.")
+                this_count += len(property_items)
+                self.record_progress(max(this_count, skip_to))
+            self.finish_cards(property_items)
 
             try:
-                # Find Button
-                load_more_button = self.driver.find_element(
-                    By.XPATH, "//span[text()='Load more results']/ancestor::button"
-                )
-
-                # Scroll to the button positon with some randomness
-                button_y_position = self.driver.execute_script(
-                    "return arguments[0].getBoundingClientRect().top + window.pageYOffset;",
-                    load_more_button
-                )
-                offset = random.randint(20, 50)
-                target_y_position = button_y_position - offset
-                self.driver.execute_script("window.scrollTo(0, arguments[0]);", target_y_position)
-
-
-                # Sleep some random time then click then sleep again
-                time.sleep(random.uniform(3, 5))
-                load_more_button.click()
-                print("Clicked 'Load more results' button. Waiting for next batch...")
-                time.sleep(random.uniform(3, 5))
+                with self.stats.stage('scroll'):
+                    # Find Button
+                    load_more_button = self.driver.find_element(
+                        By.XPATH, "//span[text()='Load more results']/ancestor::button"
+                    )
+
+                    # Scroll to the button positon with some randomness
+                    button_y_position = self.driver.execute_script(
+                        "return arguments[0].getBoundingClientRect().top + window.pageYOffset;",
+                        load_more_button
+                    )
+                    offset = random.randint(20, 50)
+                    target_y_position = button_y_position - offset
+                    self.driver.execute_script("window.scrollTo(0, arguments[0]);", target_y_position)
+
+
+                    # Pause briefly, click, then wait for the next batch of cards to arrive
+                    self.waiter.pause()
+                    load_more_button.click()
+                    print("Clicked 'Load more results' button. Waiting for next batch...")
+                    self.stats.count('load_more_clicks')
+                    self.waiter.for_new_cards()
 
             except Exception as e:
                 print("No more results...")
                 break
 
+    def finish_cards(self, items):
+        # Tags the cards of a written batch, or archives the page and then drops them
+        if self.drop_cards and self.archive_pages:
+            try:
+                with self.stats.stage('archive'):
+                    self.archive_page()
+            except Exception as e:
+                print("Could not archive page:", e)
+        with self.stats.stage('write'):
+            self.driver.execute_script(FINISH_CARDS_SCRIPT, items, self.drop_cards)
+
     def load_page(self, url):
+        self.scrape_bucket(self.open_bucket(url))
+
+    def start_bucket(self):
+        # A bucket that was opened but never scraped was over the cap and split by the planner
+        if self.stats.bucket is not None and not self.stats.reported:
+            self.report_bucket("split")
+        self.stats = BucketStats(self.bucket_label, self.waiter)
+        # Traffic between buckets is not counted towards either
+        self.network.take()
+
+    def report_bucket(self, status):
+        record = self.stats.record(status)
+        # The bucket's results page is still the current document, so its load time can be read
+        self.network.page_loaded()
+        record['network'] = self.network.take()
+        if self.report:
+            self.report.write(record)
+
+    def open_bucket(self, url):
+        self.start_bucket()
+        try:
+            with self.stats.stage('navigate'):
+                self.stats.expected = self._open_bucket(url)
+        except BaseException:
+            self.report_bucket("failed")
+            raise
+        return self.stats.expected
+
+    def _open_bucket(self, url):
+        # Loads a bucket's search results and returns how many properties Booking.com reports for it
         
         self.driver.get(url)
         
-        #give tghis some time
-        while True:
-            try:
-                num_in_price_range = int(
-                    self.driver.find_elements(By.CSS_SELECTOR, '[aria-live="assertive"]')[0]
-                    .text.split()[1].replace(",", "")
-                )
-                break
-            except Exception as e:
-                print("Error reading number of properties:", e)
-                time.sleep(random.uniform(3, 5))
+        # Wait until the result count has rendered, within the step's timeout budget
+        try:
+            count_text = self.waiter.until(self.read_result_count)
+        except TimeoutException:
+            print("Error reading number of properties: result count never appeared")
+            raise
+        num_in_price_range = int(count_text.split()[1].replace(",", ""))
 
         print(f"Number of properties in range: {num_in_price_range}")
+        return num_in_price_range
+
+    def read_result_count(self, driver):
+        # Returns the "<place>: N properties found" text once it parses, otherwise False to keep waiting
+        try:
+            text = driver.find_elements(By.CSS_SELECTOR, '[aria-live="assertive"]')[0].text
+            int(text.split()[1].replace(",", ""))
+            return text
+        except (IndexError, ValueError, WebDriverException):
+            return False
+
+    def sort_results(self, option):
+        # Picks a sort order from the dropdown and waits for the result list to re-render under it
+        self.driver.execute_script("window.scrollTo(0, 0);")
+        self.waiter.pause()
+        sorters_dropdown_trigger = self.driver.find_element(By.CSS_SELECTOR, '[data-testid="sorters-dropdown-trigger"]')
+        self.driver.execute_script("arguments[0].scrollIntoView(true);", sorters_dropdown_trigger)
+        sorters_dropdown_trigger.click()
+        sort_option = self.waiter.for_visible((By.CSS_SELECTOR, f'button[data-id="{option}"]'))
+        first_card = self.driver.execute_script("return document.querySelector(arguments[0]);", CARD_SELECTOR)
+        sort_option.click()
+
+        if first_card:
+            self.waiter.for_stale(first_card)
+            self.waiter.for_first_card()
+        elif self.drop_cards:
+            # The last pass dropped every card it read, so there is no old list to go stale
+            self.waiter.for_new_cards()
+        else:
+            self.waiter.pause()
+
+    def scrape_bucket(self, num_in_price_range):
+        status = "failed"
+        try:
+            self._scrape_bucket(num_in_price_range)
+            status = "done"
+        finally:
+            self.report_bucket(status)
+
+    def _scrape_bucket(self, num_in_price_range):
+        # Scrapes the bucket that open_bucket left open in the browser
         
         # If number of listings are less than 1,000 for sub-query simply scrape each of them
         if num_in_price_range < 1000:
+            self.sort_pass = "default"
             self.scroll_page(num_in_price_range)
         
         # If number of listings are greater than 1,000 for sub-query, must scrape top 1,000 by price, then scape remaining number but from least to highest cost
         else:
+            if num_in_price_range > 2000:
+                print(f"Warning: {num_in_price_range - 2000} listings in this bucket cannot be reached by sorting both ways")
+
             while True:
                 try:
-        
-                    # Scroll to top of screen and select high-to-low filter
-                    self.driver.execute_script("window.scrollTo(0, 0);")
-                    time.sleep(random.uniform(3, 5))
-                    sorters_dropdown_trigger = self.driver.find_element(By.CSS_SELECTOR, '[data-testid="sorters-dropdown-trigger"]')
-                    sorters_dropdown_trigger.click()
-                    WebDriverWait(self.driver, 30).until(
-                        EC.visibility_of_element_located((By.CSS_SELECTOR, 'button[data-id="price_from_high_to_low"]'))
-                    )
-                    price_highest_option = self.driver.find_element(By.CSS_SELECTOR, 'button[data-id="price_from_high_to_low"]')
-                    price_highest_option.click()
-
-                    time.sleep(random.uniform(3, 5))
-
-                    # Scrape result
+                    # Sort high-to-low and scrape the first 1,000
+                    with self.stats.stage('sort'):
+                        self.sort_results("price_from_high_to_low")
+                    self.sort_pass = "price_from_high_to_low"
                     print("Beginning to scrape first 1,000 of price bucket")
                     self.scroll_page(1000)
-
                     break
 
                 except TimeoutException:
-                    # Wait for dropdown to appear, if not refresh and try again
-                    print("Element not visible after 30 seconds, retrying")
-                    time.sleep(random.uniform(3, 5))
-                    self.driver.refresh()
+                    # Dropdown or re-sorted results never showed up, refresh and try again
+                    print(f"Sorting did not complete within {self.waiter.policy.timeout:.0f} seconds, retrying")
+                    self.stats.count('sort_retries')
+                    with self.stats.stage('sort'):
+                        self.waiter.pause()
+                        self.driver.refresh()
 
             print("Collected 1st 1000. Begining to collect 2nd half of this price bucket")
-            time.sleep(random.uniform(3, 5))
+            self.waiter.pause()
 
             while True:
                 try:
-                    # Scroll to top of screen and select low-to-high filter
-                    self.driver.execute_script("window.scrollTo(0, 0);")
-                    time.sleep(random.uniform(3, 5))
-                    sorters_dropdown_trigger = self.driver.find_element(By.CSS_SELECTOR, '[data-testid="sorters-dropdown-trigger"]')
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", sorters_dropdown_trigger)
-                    sorters_dropdown_trigger.click()
-                    WebDriverWait(self.driver, 30).until(
-                        EC.visibility_of_element_located((By.CSS_SELECTOR, 'button[data-id="price"]'))
-                    )
-                    price_highest_option = self.driver.find_element(By.CSS_SELECTOR, 'button[data-id="price"]')
-                    price_highest_option.click()
-                    
-                    time.sleep(random.uniform(3, 5))
-
-                    # Scrape result
+                    # Sort low-to-high and scrape the remainder
+                    with self.stats.stage('sort'):
+                        self.sort_results("price")
+                    self.sort_pass = "price"
                     print("Beginning to scrape remaining of price bucket")
                     remaining = num_in_price_range - 1000
                     self.scroll_page(remaining)
-
                     break
                 
                 except TimeoutException:
-                    # Wait for dropdown to appear, if not refresh and try again
-                    print("Element not visible after 30 seconds, retrying")
-                    time.sleep(random.uniform(3, 5))
-                    self.driver.refresh()
+                    # Dropdown or re-sorted results never showed up, refresh and try again
+                    print(f"Sorting did not complete within {self.waiter.policy.timeout:.0f} seconds, retrying")
+                    self.stats.count('sort_retries')
+                    with self.stats.stage('sort'):
+                        self.waiter.pause()
+                        self.driver.refresh()
 
 
     def close(self):
+        print("Waits:", self.waiter.summary())
+        if self.writer:
+            self.writer.close()
         self.driver.quit()
 
 ###############################
 #         Main Script         #
 ###############################
 
+def bucket_url(search_url, lower, upper):
+    nflt_value = f"price%3DAUD-{lower}-{upper}-1"
+    return f"{search_url}&nflt={nflt_value}"
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Scrape Booking.com search results into output/<DD-MM-YYYY>.csv.")
+    parser.add_argument('url', nargs='?', default=None, help="Search results URL to scrape (defaults to Australia, 1-2 Feb 2026).")
+    parser.add_argument('--workers', type=int, default=1, help="Number of browser sessions scraping price buckets in parallel.")
+    parser.add_argument('--retries', type=int, default=2, help="Times a failed bucket is retried on a fresh browser in --workers mode.")
+    parser.add_argument('--jitter', type=float, nargs=2, default=[0.3, 1.0], metavar=('MIN', 'MAX'),
+                        help="Random pause in seconds added after every wait, so actions stay human-paced.")
+    parser.add_argument('--step-timeout', type=float, default=30.0,
+                        help="Seconds each wait may spend on its page signal before the step is treated as failed.")
+    parser.add_argument('--dedupe', choices=['exact', 'bloom'], default='exact',
+                        help="Dedupe store: exact 64-bit URL hashes, or a fixed-size Bloom filter for very long runs.")
+    parser.add_argument('--bloom-error', type=float, default=BLOOM_ERROR_RATE,
+                        help="False-positive rate of the Bloom filter at its capacity of 2,000,000 listings.")
+    parser.add_argument('--resume', nargs='?', const=datetime.now().strftime("%d-%m-%Y"), metavar='DD-MM-YYYY',
+                        help="Continue an interrupted scrape (today's by default) from its journal, appending to its CSV.")
+    parser.add_argument('--block', nargs='*', default=DEFAULT_RESOURCE_TYPES, choices=list(RESOURCE_PATTERNS), metavar='TYPE',
+                        help=f"Resource types the browser never downloads (default: {' '.join(DEFAULT_RESOURCE_TYPES)}). "
+                             f"Any of {', '.join(RESOURCE_PATTERNS)}; give none to allow every type.")
+    parser.add_argument('--block-url', action='append', default=[], metavar='PATTERN',
+                        help="Also block URLs matching this pattern ('*' is a wildcard), on top of the known trackers and maps.")
+    parser.add_argument('--no-block', action='store_true', help="Download every resource, as a normal browser would.")
+    parser.add_argument('--enrich', action='store_true',
+                        help="Fetch listings' detail pages in the background for their full address (see enrich.py).")
+    parser.add_argument('--enrich-concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Detail pages fetched at once.")
+    parser.add_argument('--enrich-rate', type=float, default=DEFAULT_RATE, help="Most detail requests started per second.")
+    parser.add_argument('--drop-cards', action='store_true',
+                        help="Remove property cards from the page once written, so long buckets do not slow the browser down.")
+    return parser.parse_args()
+
 if __name__ == '__main__':
 
-    current_date = datetime.now().strftime("%d-%m-%Y")
+    args = parse_arguments()
+    current_date = args.resume or datetime.now().strftime("%d-%m-%Y")
     csv_file = f"output/{current_date}.csv"
-    scraper = BookingScraper(csv_file)
 
     # Main search URL
     search_url = (
@@ -329,36 +555,99 @@ if __name__ == '__main__':
         "&group_adults=2&group_children=0&no_rooms=1&selected_currency=AUD"
     )
 
-    if len(sys.argv) > 1:
-        search_url = sys.argv[1]
-    
+    if args.url:
+        search_url = args.url
+
+    # Price buckets start from the previous run's plan (or the fixed $10 slices) and adapt to observed counts
+    planner = PricePlanner(plan_path(search_url))
+    wait_policy = WaitPolicy(jitter=tuple(args.jitter), timeout=args.step_timeout)
+    listings = make_store(args.dedupe, args.bloom_error)
+    block_policy = None
+    if not args.no_block:
+        block_policy = BlockPolicy(args.block, DEFAULT_URL_PATTERNS + args.block_url)
+
+    # Progress is journalled on every run, so any run can later be resumed
     try:
-        scraper.driver.get(search_url)
-    except:
-        print("Looks like your URL is invalid. Try something like this:\nhttps://www.booking.com/searchresults.en-gb.html?ss=Nice%2C+Provence-Alpes-C%C3%B4te+d%27Azur%2C+France&ssne=Australia&ssne_untouched=Australia&efdco=1&label=gen173nr-1BCAEoggI46AdIM1gEaA-IAQGYAQm4AQfIAQzYAQHoAQGIAgGoAgO4Aryon78GwAIB0gIkMjk0Mjc0YzctZmZlOC00OGEwLWEzY2EtZWE4NjBjZmFlODY52AIF4AIB&sid=83dccf7364e141546e8a83efc3ad15bc&aid=304142&lang=en-gb&sb=1&src_elem=sb&src=index&dest_id=-1454990&dest_type=city&ac_position=0&ac_click_type=b&ac_langcode=en&ac_suggestion_list_length=5&search_selected=true&search_pageview_id=adca4e1ebc7a03a7&ac_meta=GhBhZGNhNGUxZWJjN2EwM2E3IAAoATICZW46BE5pY2VAAEoAUAA%3D&checkin=2026-06-10&checkout=2026-06-11&group_adults=2&no_rooms=1&group_children=0")
+        journal = ScrapeJournal(csv_file, search_url, resume=bool(args.resume))
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
+    if args.resume:
+        print(f"Resuming scrape into {csv_file}")
+    report = RunReport(csv_file, resume=bool(args.resume))
+
+    # Detail pages are fetched on their own threads while the cards are scraped
+    enrichment_cache = EnrichmentCache() if args.enrich else None
+    enricher = Enricher(enrichment_cache, args.enrich_concurrency, args.enrich_rate) if args.enrich else None
+
+    if args.workers > 1:
+        # Buckets are shared out between independent browser sessions; rows still land in bucket order
+        from pool import ScraperPool
+
+        print(f"Beginning scrape with {args.workers} workers...")
+        buckets = [(bucket_label(lower, upper), bucket_url(search_url, *price_bounds(lower, upper)))
+                   for lower, upper, _ in planner.initial_ranges()]
+        failed = ScraperPool(csv_file, args.workers, max_retries=args.retries, wait_policy=wait_policy,
+                             journal=journal, listings=listings, report=report, block_policy=block_policy,
+                             drop_cards=args.drop_cards, enricher=enricher).run(buckets)
+        for label, url in failed:
+            print(f"Gave up on range {label}: {url}")
+
+    else:
+        scraper = BookingScraper(csv_file, listings=listings, wait_policy=wait_policy, journal=journal, report=report,
+                                 block_policy=block_policy)
+        scraper.drop_cards = args.drop_cards
+        scraper.enricher = enricher
+
+        try:
+            scraper.driver.get(search_url)
+        except:
+            print("Looks like your URL is invalid. Try something like this:\nhttps://www.booking.com/searchresults.en-gb.html?ss=Nice%2C+Provence-Alpes-C%C3%B4te+d%27Azur%2C+France&ssne=Australia&ssne_untouched=Australia&efdco=1&label=gen173nr-1BCAEoggI46AdIM1gEaA-IAQGYAQm4AQfIAQzYAQHoAQGIAgGoAgO4Aryon78GwAIB0gIkMjk0Mjc0YzctZmZlOC00OGEwLWEzY2EtZWE4NjBjZmFlODY52AIF4AIB&sid=83dccf7364e141546e8a83efc3ad15bc&aid=304142&lang=en-gb&sb=1&src_elem=sb&src=index&dest_id=-1454990&dest_type=city&ac_position=0&ac_click_type=b&ac_langcode=en&ac_suggestion_list_length=5&search_selected=true&search_pageview_id=adca4e1ebc7a03a7&ac_meta=GhBhZGNhNGUxZWJjN2EwM2E3IAAoATICZW46BE5pY2VAAEoAUAA%3D&checkin=2026-06-10&checkout=2026-06-11&group_adults=2&no_rooms=1&group_children=0")
+            sys.exit(1)
+
 
+        print(f"Beginning scrape...")
 
-    print(f"Beginning scrape...")
+        def open_bucket(lower, upper):
+            final_url = bucket_url(search_url, lower, upper)
+            print(f"Scraping URL for range {lower} to {upper}: {final_url}")
+            scraper.bucket_label = f"{lower} to {upper}"
+            return scraper.open_bucket(final_url)
 
-    # Build price buckets to cope with 1,000 listing cap
-    price_ranges = []
-    price_ranges.append(("min", "20"))
-    for lower in range(21, 890, 10):
-        upper = lower + 9
-        price_ranges.append((str(lower), str(upper)))
-    price_ranges.append(("890", "max"))
+        def scrape_bucket(count):
+            scraper.scrape_bucket(count)
+            scraper.waiter.pause()
+
+        # Iterate over each price bucket and scrape all data, splitting any bucket over the cap
+        try:
+            planner.run(open_bucket, scrape_bucket, journal=journal)
+        finally:
+            # Buffered rows are flushed and journalled even when the run stops early
+            scraper.close()
 
-    # Iterate over each price bucket and scrape all data
-    for (lower, upper) in price_ranges:
-        nflt_value = f"price%3DAUD-{lower}-{upper}-1"
-        final_url = f"{search_url}&nflt={nflt_value}"
-        print(f"Scraping URL for range {lower} to {upper}: {final_url}")
-        scraper.load_page(final_url)
-        time.sleep(random.uniform(3, 5))
+    journal.close()
+    report.close()
+    print("Dedupe:", listings.describe())
+    print("Stages:", report.summary())
+    print("Run report has been stored in", report.path)
 
     
     print("Scape is complete")
     print("Result has been stored in", csv_file)
 
-    scraper.close()
+    if enricher:
+        # Whatever is still queued is left for `python enrich.py`, so the run ends when the scrape does
+        enricher.stop()
+        print("Enrichment:", enricher.summary())
+        merged = merge_addresses(csv_file, enrichment_cache)
+        enrichment_cache.close()
+        print(f"{merged} listings have a full address; run `python enrich.py {current_date}` for the rest")
+
+    # Write the typed columnar copy the API memory-maps at startup
+    print("Columnar snapshot has been stored in", snapshot.convert_csv(csv_file))
+
+    # Record how prices, scores and review counts moved since the previous scrape
+    change_index = ChangeIndex()
+    indexed = change_index.update()
+    change_index.close()
+    print(f"Change index has been updated with {', '.join(indexed) or 'no new snapshots'}")
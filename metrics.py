@@ -0,0 +1,98 @@
+# Request metrics for app.py, exposed in the Prometheus text format at /metrics
+#
+# Counters and histograms are kept in this process. Under serve.py every worker keeps its own, and each
+# series carries the worker's pid, so series from different workers never overwrite one another.
+import os
+import threading
+
+# Seconds, following the Prometheus client defaults
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+ROW_BUCKETS = [0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(dict(key))} {format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # labels -> [count in each bucket (not cumulative), count, sum]
+        self.values = {}
+
+    def observe(self, labels, value):
+        key = tuple(labels.items())
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * len(self.buckets), 0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += 1
+        state[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, count, total) in sorted(self.values.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': format_number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_number(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter("api_requests_total", "Requests served, by route and status code.")
+        self.latency = Histogram("api_request_duration_seconds", "Time to build each response, by route.", LATENCY_BUCKETS)
+        self.rows = Histogram("api_rows_scanned", "Listings read to answer each request, by route.", ROW_BUCKETS)
+
+    def observe(self, route, status, seconds, rows_scanned):
+        labels = {'route': route, 'worker': os.getpid()}
+        with self.lock:
+            self.requests.inc({**labels, 'status': status})
+            self.latency.observe(labels, seconds)
+            self.rows.observe(labels, rows_scanned)
+
+    def render(self, gauges=()):
+        # `gauges` is [(name, help, value)] for values read at scrape time
+        with self.lock:
+            lines = self.requests.render() + self.latency.render() + self.rows.render()
+        worker = format_labels({'worker': os.getpid()})
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name}{worker} {format_number(value)}"]
+        return "\n".join(lines) + "\n"
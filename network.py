@@ -0,0 +1,153 @@
+# Resource blocking for the scraper's Chrome session, and per-bucket accounting of what it saved
+#
+# Only text is read from property cards, so photos, fonts, media and third-party trackers and maps are
+# blocked through the DevTools protocol (Network.setBlockedURLs) before they are requested. Resource types
+# are blocked by the URL patterns that identify them, as setBlockedURLs only matches URLs.
+#
+# Chrome's Network events are tallied for the run report: requests completed, bytes received, and requests
+# blocked. A blocked request never transfers anything, so the bytes it saved are estimated from the typical
+# size of its resource type on Booking.com result pages; benchmarks/bench_blocking.py measures the real
+# savings against the fixture server. Events arrive through undetected_chromedriver's CDP listener when
+# the driver has one, and otherwise from Chrome's performance log (the goog:loggingPrefs capability).
+import json
+import threading
+from collections import Counter
+from selenium.common.exceptions import WebDriverException
+
+RESOURCE_PATTERNS = {
+    'Image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'Font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'Media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'Stylesheet': ['*.css*'],
+    'Script': ['*.js', '*.js?*'],
+}
+
+# Photos, fonts and media carry no card text; stylesheets stay, as scrolling depends on the page's layout
+DEFAULT_RESOURCE_TYPES = ['Image', 'Font', 'Media']
+
+# Analytics, ads and map tiles that results pages pull in from other hosts
+DEFAULT_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*connect.facebook.net*',
+    '*hotjar.com*', '*bat.bing.com*', '*maps.googleapis.com*', '*maps.gstatic.com*',
+]
+
+# Typical transfer size of one request of each resource type on a Booking.com results page, in bytes
+TYPICAL_BYTES = {'Image': 25_000, 'Font': 40_000, 'Media': 500_000, 'Stylesheet': 30_000, 'Script': 60_000}
+OTHER_BYTES = 10_000
+
+NAVIGATION_TIMING_SCRIPT = """
+var entry = performance.getEntriesByType('navigation')[0];
+return entry && entry.loadEventEnd > 0 ? entry.loadEventEnd - entry.startTime : null;
+"""
+
+
+class BlockPolicy:
+    # resource_types: keys of RESOURCE_PATTERNS to block
+    # url_patterns: extra setBlockedURLs patterns ('*' matches anything), e.g. a tracker's host
+    def __init__(self, resource_types=None, url_patterns=None):
+        self.resource_types = list(DEFAULT_RESOURCE_TYPES if resource_types is None else resource_types)
+        self.url_patterns = list(DEFAULT_URL_PATTERNS if url_patterns is None else url_patterns)
+        unknown = [kind for kind in self.resource_types if kind not in RESOURCE_PATTERNS]
+        if unknown:
+            raise ValueError(f"Unknown resource types {unknown}. Expected some of {list(RESOURCE_PATTERNS)}.")
+
+    def patterns(self):
+        return [pattern for kind in self.resource_types for pattern in RESOURCE_PATTERNS[kind]] + self.url_patterns
+
+
+class NetworkMonitor:
+    # Applies a BlockPolicy to a driver and tallies its network traffic until take() is called
+    def __init__(self, driver, policy=None):
+        self.driver = driver
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.types = {}
+        self.counts = Counter()
+        self.blocked_types = Counter()
+        self.page_load = 0.0
+        self.pages = 0
+        self.polling = False
+        self.active = False
+
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            if policy is not None:
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': policy.patterns()})
+        except (AttributeError, WebDriverException) as e:
+            print("Could not set up network monitoring or resource blocking:", e)
+            return
+        self.active = True
+
+        # undetected_chromedriver reads the performance log itself and hands events to its listeners
+        add_listener = getattr(self.driver, 'add_cdp_listener', None)
+        listening = False
+        if add_listener:
+            for method in ('Network.requestWillBeSent', 'Network.loadingFinished', 'Network.loadingFailed'):
+                listening = add_listener(method, self.handle) is not False
+        self.polling = not listening
+
+    def handle(self, message):
+        method, params = message.get('method'), message.get('params', {})
+        with self.lock:
+            if method == 'Network.requestWillBeSent':
+                self.types[params.get('requestId')] = params.get('type')
+            elif method == 'Network.loadingFinished':
+                self.types.pop(params.get('requestId'), None)
+                self.counts['requests'] += 1
+                self.counts['bytes'] += int(params.get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed':
+                kind = self.types.pop(params.get('requestId'), None) or params.get('type')
+                if params.get('blockedReason'):
+                    self.counts['blocked'] += 1
+                    self.blocked_types[kind] += 1
+                else:
+                    self.counts['failed'] += 1
+
+    def poll(self):
+        # Drains the performance log when no CDP listener is delivering events
+        if not self.polling:
+            return
+        try:
+            entries = self.driver.get_log('performance')
+        except (WebDriverException, ValueError):
+            # The driver was started without performance logging
+            self.polling = False
+            return
+        for entry in entries:
+            self.handle(json.loads(entry['message'])['message'])
+
+    def page_loaded(self):
+        # Adds the current page's navigation time (request start to load event) to the tally
+        if not self.active:
+            return
+        try:
+            milliseconds = self.driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+        except WebDriverException:
+            return
+        if milliseconds is not None:
+            with self.lock:
+                self.page_load += milliseconds / 1000
+                self.pages += 1
+
+    def take(self):
+        # Returns the traffic since the last call, for the run report, and starts a new tally
+        self.poll()
+        with self.lock:
+            saved = sum(TYPICAL_BYTES.get(kind, OTHER_BYTES) * n for kind, n in self.blocked_types.items())
+            totals = {
+                'requests': self.counts['requests'],
+                'bytes': self.counts['bytes'],
+                'failed': self.counts['failed'],
+                'blocked': self.counts['blocked'],
+                'estimated_bytes_saved': saved,
+                'pages': self.pages,
+                'page_load_seconds': round(self.page_load, 3),
+            }
+            self.counts.clear()
+            self.blocked_types.clear()
+            self.page_load = 0.0
+            self.pages = 0
+            # Requests still in flight keep their type; a runaway map of abandoned ones is dropped
+            if len(self.types) > 10_000:
+                self.types.clear()
+            return totals